@@ -0,0 +1,95 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+import threading
+
+from node_config import MAX, apply_node_config
+
+
+class AcquisitionProfile:
+    """
+    Stream settings that belong together: buffer handling, number of
+    buffers, packet resend and frame rate (MAX, a rate in fps capped at
+    what the device allows, or None to keep the configured rate).
+    """
+
+    def __init__(self, name, buffer_handling_mode, buffer_count, packet_resend, frame_rate=MAX):
+        self.name = name
+        self.buffer_handling_mode = buffer_handling_mode
+        self.buffer_count = buffer_count
+        self.packet_resend = packet_resend
+        self.frame_rate = frame_rate
+
+    def get_node_config(self, device):
+        node_config = [
+            ('tl_stream_nodemap', 'StreamBufferHandlingMode', self.buffer_handling_mode),
+            ('tl_stream_nodemap', 'StreamPacketResendEnable', self.packet_resend),
+        ]
+        frame_rate = self.frame_rate
+        if frame_rate is None:
+            return node_config
+        if frame_rate != MAX:
+            frame_rate = min(float(frame_rate), device.nodemap['AcquisitionFrameRate'].max)
+        return node_config + [
+            ('nodemap', 'AcquisitionFrameRateEnable', True),
+            ('nodemap', 'AcquisitionFrameRate', frame_rate),
+        ]
+
+    def __repr__(self):
+        return (f'AcquisitionProfile({self.name}: {self.buffer_handling_mode}, '
+                f'{self.buffer_count} buffers, resend {self.packet_resend}, {self.frame_rate} fps)')
+
+
+ACQUISITION_PROFILES = {
+    # newest frame only: no backlog, and a resent packet arrives too late to show
+    'preview': AcquisitionProfile('preview', 'NewestOnly', 3, False, 30.0),
+    # every frame in order, enough buffers to ride out slow saves; the frame
+    # rate stays what the configuration (or the bandwidth budget) set
+    'record': AcquisitionProfile('record', 'OldestFirst', 50, True, None),
+    # short full rate bursts into a deep queue that is drained afterwards
+    'burst': AcquisitionProfile('burst', 'OldestFirst', 200, True, MAX),
+}
+
+
+class ProfileSwitcher:
+    """
+    Switches a device between acquisition profiles while the process keeps
+    running. Buffer handling and buffer count can only change while the
+    stream is stopped, so a switch stops the stream, writes the nodes that
+    differ and starts it again. Call switch() from the thread that calls
+    get_buffer, or while no thread does. A ManagedDevice gets the active
+    profile's nodes registered, so they are written again on reconnect.
+    """
+
+    def __init__(self, device, profiles=ACQUISITION_PROFILES):
+        self.device = device
+        self.profiles = profiles
+        self.profile = None
+        self.streaming = False
+        self._lock = threading.Lock()
+
+    def switch(self, name):
+        """
+        Activates the named profile and (re)starts the stream. Returns the
+        nodes that were written.
+        """
+        profile = self.profiles[name]
+        with self._lock:
+            if self.streaming:
+                self.device.stop_stream()
+                self.streaming = False
+            node_config = profile.get_node_config(self.device)
+            written = apply_node_config(self.device, node_config)
+            register_node_config = getattr(self.device, 'register_node_config', None)
+            if register_node_config is not None:
+                register_node_config(node_config)
+            self.device.start_stream(profile.buffer_count)
+            self.streaming = True
+            self.profile = profile
+        return written
+
+    def stop(self):
+        with self._lock:
+            if self.streaming:
+                self.device.stop_stream()
+                self.streaming = False
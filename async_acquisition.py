@@ -0,0 +1,246 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from frame_pool import FramePool
+from log_queue import log_event
+
+# get_buffer timeout of the grab calls; bounds how long stop() waits
+GRAB_TIMEOUT_MS = 500
+# get_set gives up after dropping this many stream queues' worth of frames
+RESYNC_QUEUE_DEPTHS = 3
+# Frame rate of the PTP synchronized demo cameras
+PTP_SYNC_FRAME_RATE = 10.0
+
+
+async def run_blocking(function, *args, executor=None, **kwargs):
+    """
+    Runs a blocking call (save, encode, node access) in an executor.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(function, *args, **kwargs))
+
+
+async def encode_jpeg(image, quality=80, executor=None):
+    ok, encoded = await run_blocking(cv2.imencode, '.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality],
+                                     executor=executor)
+    if not ok:
+        raise ValueError('JPEG encoding failed')
+    return encoded.tobytes()
+
+
+async def save_frame(frame, save_dir, save=None, executor=None):
+    """
+    Saves a pooled frame in an executor and releases it afterwards, so
+    pass frame.retain() when scheduling the save from a frames() loop.
+    save(array, save_dir, metadata) defaults to utils.save_images.
+    """
+    if save is None:
+        from utils import save_images as save
+    try:
+        await run_blocking(save, frame.array, save_dir, frame.metadata, executor=executor)
+    finally:
+        frame.release()
+
+
+class AsyncCamera:
+    """
+    asyncio front end of one device:
+
+        async with AsyncCamera(device) as camera:
+            async for frame in camera.frames():
+                ...
+
+    get_buffer runs in the camera's executor with a short timeout; each
+    buffer is copied into the camera's FramePool and requeued right away.
+    A frame is released when the loop moves on, call frame.retain() to
+    keep it longer (e.g. for save_frame).
+    """
+
+    def __init__(self, device, buffer_count=10, pool_size=8, timeout_ms=GRAB_TIMEOUT_MS,
+                 executor=None, chunk_reader=None):
+        self.device = device
+        self.buffer_count = buffer_count
+        self.pool_size = pool_size
+        self.timeout_ms = timeout_ms
+        self.chunk_reader = chunk_reader
+        self.serial = device.nodemap['DeviceSerialNumber'].value
+        self.pool = None
+        self.frame_count = 0
+        self.incomplete_count = 0
+        self.dropped_count = 0
+        self.streaming = False
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=1,
+                                                        thread_name_prefix=f'grab-{self.serial}')
+
+    async def start(self):
+        await run_blocking(self.device.start_stream, self.buffer_count, executor=self._executor)
+        self.streaming = True
+
+    async def stop(self):
+        # the grab in flight returns within timeout_ms
+        self.streaming = False
+        await run_blocking(self.device.stop_stream, executor=self._executor)
+        if self._own_executor:
+            self._executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.stop()
+
+    def _grab(self):
+        try:
+            buffer = self.device.get_buffer(timeout=self.timeout_ms)
+        except TimeoutError:
+            return None
+        try:
+            if buffer.is_incomplete:
+                self.incomplete_count += 1
+                return None
+            if self.pool is None:
+                self.pool = FramePool.for_buffer(buffer, self.pool_size)
+            frame = self.pool.copy_from(buffer)
+            if frame is None:
+                # the application still holds every pool frame
+                self.dropped_count += 1
+                return None
+            if self.chunk_reader is not None:
+                frame.metadata = self.chunk_reader.read(buffer)
+            self.frame_count += 1
+            return frame
+        finally:
+            self.device.requeue_buffer(buffer)
+
+    async def get_frame(self):
+        """
+        Returns the next frame (one reference, to be released by the
+        caller), or None once the camera is stopped.
+        """
+        loop = asyncio.get_running_loop()
+        while self.streaming:
+            frame = await loop.run_in_executor(self._executor, self._grab)
+            if frame is not None:
+                return frame
+        return None
+
+    async def frames(self):
+        while True:
+            frame = await self.get_frame()
+            if frame is None:
+                return
+            try:
+                yield frame
+            finally:
+                frame.release()
+
+
+class AsyncRig:
+    """
+    Synchronized frame sets of several AsyncCameras. Frames are matched by
+    device timestamp, so the cameras must share a clock (PTP): while the
+    timestamps of a set are more than tolerance_ns apart, the oldest frame
+    is dropped and replaced by that camera's next frame. Without a shared
+    clock the timestamps never line up, so a set gives up after
+    max_resyncs drops, by default RESYNC_QUEUE_DEPTHS stream queues per
+    camera.
+    """
+
+    def __init__(self, cameras, tolerance_ns=1000000, max_resyncs=None):
+        self.cameras = cameras
+        self.tolerance_ns = tolerance_ns
+        if max_resyncs is None:
+            max_resyncs = RESYNC_QUEUE_DEPTHS * sum(camera.buffer_count for camera in cameras)
+        self.max_resyncs = max_resyncs
+        self.set_count = 0
+        self.resync_count = 0
+
+    async def __aenter__(self):
+        await asyncio.gather(*(camera.start() for camera in self.cameras))
+        return self
+
+    async def __aexit__(self, *args):
+        await asyncio.gather(*(camera.stop() for camera in self.cameras))
+
+    async def get_set(self):
+        """
+        Returns {serial: frame} with one reference per frame, or None once a
+        camera is stopped or the timestamps do not line up within
+        max_resyncs dropped frames.
+        """
+        frames = list(await asyncio.gather(*(camera.get_frame() for camera in self.cameras)))
+        resyncs = 0
+        while None not in frames:
+            timestamps = [frame.timestamp_ns for frame in frames]
+            if max(timestamps) - min(timestamps) <= self.tolerance_ns:
+                self.set_count += 1
+                return {camera.serial: frame for camera, frame in zip(self.cameras, frames)}
+            if resyncs >= self.max_resyncs:
+                log_event('resync_failed', f'Timestamps still {max(timestamps) - min(timestamps)} ns apart '
+                                           f'after {resyncs} dropped frames, do the cameras share a PTP clock?',
+                          level='ERROR')
+                break
+            resyncs += 1
+            oldest = timestamps.index(min(timestamps))
+            frames[oldest].release()
+            self.resync_count += 1
+            frames[oldest] = await self.cameras[oldest].get_frame()
+        for frame in frames:
+            if frame is not None:
+                frame.release()
+        return None
+
+    async def sets(self):
+        while True:
+            frame_set = await self.get_set()
+            if frame_set is None:
+                return
+            try:
+                yield frame_set
+            finally:
+                for frame in frame_set.values():
+                    frame.release()
+
+
+if __name__ == '__main__':
+    from chunk_meta import ChunkReader, enable_frame_chunks
+    from device_manager import create_devices_with_backoff
+    from node_config import POLARIZED_NODE_CONFIG
+    from sync_capture import wait_for_ptp
+    from warm_start import warm_start_devices
+
+    def enable_ptp_sync(devices, frame_rate=PTP_SYNC_FRAME_RATE):
+        # frame starts aligned on the shared PTP clock, so the timestamps of a set match
+        for device in devices:
+            nodemap = device.nodemap
+            nodemap['PtpEnable'].value = True
+            nodemap['AcquisitionStartMode'].value = 'PTPSync'
+            nodemap['PTPSyncFrameRate'].value = frame_rate
+        wait_for_ptp(devices)
+
+    async def main(devices, number_of_sets=50):
+        warm_start_devices(devices, POLARIZED_NODE_CONFIG)
+        enable_ptp_sync(devices)
+        cameras = []
+        for device in devices:
+            cameras.append(AsyncCamera(device, chunk_reader=ChunkReader(enable_frame_chunks(device.nodemap))))
+        saves = []
+        async with AsyncRig(cameras) as rig:
+            async for frame_set in rig.sets():
+                if rig.set_count % 10 == 0:
+                    saves.extend(asyncio.ensure_future(save_frame(frame.retain(), serial))
+                                 for serial, frame in frame_set.items())
+                if rig.set_count >= number_of_sets:
+                    break
+            await asyncio.gather(*saves)
+        log_event('async_rig', f'{rig.set_count} sets, {rig.resync_count} frames dropped to resync')
+
+    asyncio.run(main(create_devices_with_backoff(timeout_s=60)))
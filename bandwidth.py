@@ -0,0 +1,242 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+import threading
+import time
+
+from log_queue import log_event
+
+# Gigabit Ethernet, in bits per second
+LINK_CAPACITY_BPS = 1000000000
+# Part of the link kept free for resends and control traffic
+LINK_HEADROOM = 0.1
+# Ethernet (preamble, header, FCS, gap), IP, UDP and GVSP bytes per packet
+PACKET_OVERHEAD_BYTES = 20 + 14 + 4 + 20 + 8 + 8
+
+PIXEL_FORMAT_BITS = {
+    'Mono8': 8,
+    'PolarizeMono8': 8,
+    'PolarizeMono12': 16,
+    'PolarizeMono12p': 12,
+    'PolarizeMono12Packed': 12,
+    'PolarizeMono16': 16,
+    'BayerRG8': 8,
+    'BayerRG10': 16,
+    'BayerRG10p': 10,
+    'BayerRG10Packed': 12,
+    'BayerRG12': 16,
+    'BayerRG12p': 12,
+    'BayerRG12Packed': 12,
+    'BayerRG16': 16,
+    'RGB8': 24,
+    'BGR8': 24,
+    'PolarizedAngles_0d_45d_90d_135d_BayerRG8': 32,
+    'PolarizedStokes_S0_S1_S2_S3_BayerRG8': 32,
+    'PolarizedDolpAolp_BayerRG8': 16,
+    'PolarizedDolpAolp_BayerRG12p': 24,
+    'PolarizedDolp_BayerRG8': 8,
+    'PolarizedDolp_BayerRG12p': 12,
+    'PolarizedAolp_BayerRG8': 8,
+    'PolarizedAolp_BayerRG12p': 12,
+    'Coord3D_ABCY16': 64,
+    'Coord3D_ABCY16s': 64,
+    'Coord3D_ABC16': 48,
+    'Coord3D_ABC16s': 48,
+}
+
+
+def get_frame_bytes(nodemap):
+    """
+    Returns the payload of one frame in bytes. PayloadSize also covers
+    chunk data; width * height * bits per pixel is the fallback.
+    """
+    try:
+        return nodemap['PayloadSize'].value
+    except KeyError:
+        pass
+    bits_per_pixel = PIXEL_FORMAT_BITS[nodemap['PixelFormat'].value]
+    return nodemap['Width'].value * nodemap['Height'].value * bits_per_pixel // 8
+
+
+def get_wire_rate(frame_bytes, fps, packet_size):
+    """
+    Returns the rate in bits per second a camera puts on the link, packet
+    headers included.
+    """
+    payload_per_packet = packet_size - 36  # IP, UDP and GVSP headers
+    packets_per_frame = -(-frame_bytes // payload_per_packet)
+    wire_bytes = frame_bytes + packets_per_frame * PACKET_OVERHEAD_BYTES
+    return wire_bytes * 8 * fps
+
+
+class CameraBudget:
+    """
+    Requested and granted link usage of one camera.
+    """
+
+    def __init__(self, serial, frame_bytes, packet_size, requested_fps):
+        self.serial = serial
+        self.frame_bytes = frame_bytes
+        self.packet_size = packet_size
+        self.requested_fps = requested_fps
+        self.granted_fps = requested_fps
+        self.share_bps = 0
+        self.packet_delay_ns = 0
+        self.observed_bps = None
+
+    @property
+    def requested_bps(self):
+        return get_wire_rate(self.frame_bytes, self.requested_fps, self.packet_size)
+
+    @property
+    def predicted_bps(self):
+        return get_wire_rate(self.frame_bytes, self.granted_fps, self.packet_size)
+
+
+class BandwidthBudgeter:
+    """
+    Shares the capacity of one NIC between all cameras connected to it.
+    Every camera gets a share proportional to what it asks for; cameras
+    whose request does not fit get a lower frame rate. The share is
+    enforced on the camera with DeviceLinkThroughputLimit and an
+    inter-packet delay, so the bursts of several cameras interleave
+    instead of overrunning the NIC.
+    """
+
+    def __init__(self, devices, link_capacity_bps=LINK_CAPACITY_BPS,
+                 headroom=LINK_HEADROOM):
+        self.devices = devices
+        self.link_capacity_bps = link_capacity_bps
+        self.headroom = headroom
+        self.budgets = []
+
+    @property
+    def budget_bps(self):
+        return self.link_capacity_bps * (1 - self.headroom)
+
+    def read_requests(self, fps=None):
+        """
+        Reads pixel format, resolution, packet size and frame rate of every
+        device. fps overrides the frame rate currently set on the devices.
+        """
+        self.budgets = []
+        for device in self.devices:
+            nodemap = device.nodemap
+            requested_fps = fps if fps is not None else nodemap['AcquisitionFrameRate'].value
+            self.budgets.append(CameraBudget(nodemap['DeviceSerialNumber'].value,
+                                             get_frame_bytes(nodemap),
+                                             nodemap['DeviceStreamChannelPacketSize'].value,
+                                             requested_fps))
+        return self.budgets
+
+    def plan(self):
+        """
+        Computes share, frame rate and packet delay of each camera.
+        """
+        requested_total = sum(budget.requested_bps for budget in self.budgets)
+        scale = min(1.0, self.budget_bps / requested_total) if requested_total else 1.0
+        for budget in self.budgets:
+            budget.share_bps = budget.requested_bps * scale
+            budget.granted_fps = budget.requested_fps * scale
+            # spread the packets of one frame so that they arrive at the
+            # share rate instead of the line rate
+            packet_bits = (budget.packet_size + PACKET_OVERHEAD_BYTES - 36) * 8
+            packet_period_ns = packet_bits / budget.share_bps * 1e9 if budget.share_bps else 0
+            line_period_ns = packet_bits / self.link_capacity_bps * 1e9
+            budget.packet_delay_ns = max(0, int(packet_period_ns - line_period_ns))
+        return self.budgets
+
+    def apply(self, device=None):
+        """
+        Writes the planned limits to the devices, or only to device (e.g. a
+        reconnected handle), matched by serial.
+        """
+        serial = device.nodemap['DeviceSerialNumber'].value if device is not None else None
+        for planned_device, budget in zip(self.devices, self.budgets):
+            if device is None:
+                nodemap = planned_device.nodemap
+            elif budget.serial == serial:
+                nodemap = device.nodemap
+            else:
+                continue
+            nodemap['AcquisitionFrameRateEnable'].value = True
+            frame_rate_node = nodemap['AcquisitionFrameRate']
+            frame_rate_node.value = min(budget.granted_fps, frame_rate_node.max)
+            self._set_throughput_limit(nodemap, budget)
+            self._set_packet_delay(nodemap, budget)
+
+    @staticmethod
+    def _set_throughput_limit(nodemap, budget):
+        try:
+            nodemap['DeviceLinkThroughputLimitMode'].value = 'On'
+            limit_node = nodemap['DeviceLinkThroughputLimit']
+        except KeyError:
+            return
+        # DeviceLinkThroughputLimit is in bytes per second
+        limit_node.value = int(min(max(budget.share_bps / 8, limit_node.min), limit_node.max))
+
+    @staticmethod
+    def _set_packet_delay(nodemap, budget):
+        try:
+            delay_node = nodemap['GevSCPD']
+            tick_frequency = nodemap['GevTimestampTickFrequency'].value
+        except KeyError:
+            return
+        ticks = int(budget.packet_delay_ns * tick_frequency / 1e9)
+        delay_node.value = min(max(ticks, delay_node.min), delay_node.max)
+
+    def configure(self, fps=None):
+        """
+        Reads the requests, plans and applies them, then logs the plan.
+        """
+        self.read_requests(fps)
+        self.plan()
+        self.apply()
+        for budget in self.budgets:
+            log_event('bandwidth_budget', f'{budget.granted_fps:.1f}/{budget.requested_fps:.1f} fps, '
+                                          f'predicted {budget.predicted_bps / 1e6:.1f} Mbps, '
+                                          f'packet delay {budget.packet_delay_ns} ns', device=budget.serial)
+        log_event('bandwidth_budget', f'Aggregate predicted {self.get_predicted_bps() / 1e6:.1f} Mbps '
+                                      f'of {self.budget_bps / 1e6:.1f} Mbps budget')
+
+    def get_predicted_bps(self):
+        return sum(budget.predicted_bps for budget in self.budgets)
+
+
+class ThroughputMonitor:
+    """
+    Measures the delivered frame rate of each camera and logs the resulting
+    link usage against the budgeter's prediction.
+    """
+
+    def __init__(self, budgeter, interval_s=5.0):
+        self.budgeter = budgeter
+        self.interval_s = interval_s
+        self._frames = {budget.serial: 0 for budget in budgeter.budgets}
+        self._lock = threading.Lock()
+        self._start_time = time.monotonic()
+
+    def record(self, serial):
+        """
+        Counts a delivered buffer, called from the acquisition threads.
+        """
+        with self._lock:
+            self._frames[serial] += 1
+            if time.monotonic() - self._start_time >= self.interval_s:
+                self._report()
+
+    def _report(self):
+        elapsed = time.monotonic() - self._start_time
+        observed_total = 0
+        for budget in self.budgeter.budgets:
+            observed_fps = self._frames[budget.serial] / elapsed
+            budget.observed_bps = get_wire_rate(budget.frame_bytes, observed_fps,
+                                                budget.packet_size)
+            observed_total += budget.observed_bps
+            log_event('throughput', f'predicted {budget.predicted_bps / 1e6:.1f} Mbps, '
+                                    f'observed {budget.observed_bps / 1e6:.1f} Mbps ({observed_fps:.1f} fps)',
+                      device=budget.serial)
+            self._frames[budget.serial] = 0
+        log_event('throughput', f'Aggregate predicted {self.budgeter.get_predicted_bps() / 1e6:.1f} Mbps, '
+                                f'observed {observed_total / 1e6:.1f} Mbps')
+        self._start_time = time.monotonic()
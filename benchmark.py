@@ -0,0 +1,231 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+# Sensor of the TRI050S-Q; PolarizedAngles frames are half of it per angle
+SENSOR_WIDTH = 2448
+SENSOR_HEIGHT = 2048
+HELIOS_WIDTH = 640
+HELIOS_HEIGHT = 480
+COORD3D_SCALE = np.array([0.25, 0.25, 0.25], dtype=np.float32)
+COORD3D_OFFSET = np.array([-HELIOS_WIDTH / 8, -HELIOS_HEIGHT / 8, 0], dtype=np.float32)
+# A median this much slower than the baseline counts as a regression
+REGRESSION_TOLERANCE = 0.15
+
+
+def make_polarized_angles_frame(width=SENSOR_WIDTH // 2, height=SENSOR_HEIGHT // 2, seed=0):
+    """
+    PolarizedAngles_0d_45d_90d_135d_BayerRG8 frame: (height, width, 4), one
+    BayerRG8 mosaic per angle of a smooth scene with Malus' law modulation
+    and sensor noise.
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    scene = 60 + 120 * (0.5 + 0.5 * np.sin(x / 97) * np.cos(y / 131))
+    aolp = (x / width) * np.pi
+    frame = np.empty((height, width, 4), dtype=np.uint8)
+    for index, angle in enumerate(np.deg2rad([0, 45, 90, 135])):
+        channel = scene * (0.75 + 0.25 * np.cos(2 * (aolp - angle)))
+        channel[0::2, 1::2] *= 0.8  # green sites of the RGGB mosaic
+        channel[1::2, 0::2] *= 0.8
+        channel[1::2, 1::2] *= 0.6  # blue sites
+        channel += rng.normal(0, 2, channel.shape)
+        frame[:, :, index] = np.clip(channel, 0, 255)
+    return frame
+
+
+def make_coord3d_frame(width=HELIOS_WIDTH, height=HELIOS_HEIGHT, invalid_fraction=0.05, seed=0):
+    """
+    Coord3D_ABCY16 frame as an (N, 4) uint16 array: a tilted plane 0.5 to
+    1.6 m away with a fraction of invalid points.
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    z_mm = 500 + 1100 * x / width + rng.normal(0, 3, x.shape)
+    frame = np.empty((height * width, 4), dtype=np.uint16)
+    frame[:, 0] = ((x * 0.5 - COORD3D_OFFSET[0]) / COORD3D_SCALE[0]).ravel()
+    frame[:, 1] = ((y * 0.5 - COORD3D_OFFSET[1]) / COORD3D_SCALE[1]).ravel()
+    frame[:, 2] = (z_mm / COORD3D_SCALE[2]).ravel()
+    frame[:, 3] = rng.integers(0, 4096, height * width)
+    frame[rng.random(height * width) < invalid_fraction, 2] = 65535
+    return frame
+
+
+def make_stereo_pair(width=SENSOR_WIDTH // 2, height=SENSOR_HEIGHT // 2, disparity=40, seed=0):
+    """
+    Textured left/right BGR images with a horizontal disparity.
+    """
+    rng = np.random.default_rng(seed)
+    texture = rng.integers(0, 256, (height // 8, (width + disparity) // 8, 3), dtype=np.uint8)
+    texture = cv2.resize(texture, (width + disparity, height), interpolation=cv2.INTER_CUBIC)
+    return np.ascontiguousarray(texture[:, disparity:]), np.ascontiguousarray(texture[:, :width])
+
+
+def setup_single_device(temp_dir):
+    # the script's display and save helpers live in utils, no arena_api needed
+    from utils import get_cat_image, save_images
+
+    frame = make_polarized_angles_frame()
+    save_dir = os.path.join(temp_dir, 'single')
+    return {
+        'single.get_cat_image': lambda: get_cat_image(frame),
+        'single.save_images': lambda: save_images(frame, save_dir),
+    }
+
+
+def setup_multi_device(temp_dir):
+    from utils import get_RGB8_image, get_stereo_cat_image, save_stereo_images
+
+    frame = make_polarized_angles_frame()
+    image_list = get_RGB8_image(frame)
+    save_dirs = [os.path.join(temp_dir, 'left'), os.path.join(temp_dir, 'right')]
+    return {
+        'v2.get_RGB8_image': lambda: get_RGB8_image(frame),
+        'v2.get_cat_image': lambda: get_stereo_cat_image(image_list),
+        'v2.save_images': lambda: save_stereo_images([image_list, image_list], save_dirs),
+    }
+
+
+def setup_polarized_image(temp_dir):
+    from utils import polarizedImage
+
+    image = np.random.default_rng(0).integers(0, 4096, (SENSOR_HEIGHT, SENSOR_WIDTH, 1), dtype=np.uint16)
+    polarized = polarizedImage(image)
+    return {
+        'utils.raw2images': lambda: [np.ascontiguousarray(angle) for angle in polarized.raw2images()],
+    }
+
+
+def setup_helios(temp_dir):
+    from pointcloud import decode_coord3d, find_min_max_z, get_distance_heatmap, get_heatmap_lut
+
+    frame = make_coord3d_frame()
+    xyz_out = np.empty((frame.shape[0], 3), dtype=np.float32)
+    xyz, _ = decode_coord3d(frame, COORD3D_SCALE, COORD3D_OFFSET)
+    lut = get_heatmap_lut()
+    heatmap_out = np.empty((frame.shape[0], 3), dtype=np.uint8)
+    return {
+        'pointcloud.decode_coord3d': lambda: decode_coord3d(frame, COORD3D_SCALE, COORD3D_OFFSET, out=xyz_out),
+        'pointcloud.find_min_max_z': lambda: find_min_max_z(xyz, frame),
+        'pointcloud.get_distance_heatmap': lambda: get_distance_heatmap(xyz[:, 2], lut, heatmap_out),
+    }
+
+
+def setup_downcam(temp_dir):
+    from downcam import get_rectify_maps, rectify_pair
+
+    left, right = make_stereo_pair()
+    left_maps, right_maps, _, _ = get_rectify_maps()
+    return {
+        'downcam.get_rectify_maps': get_rectify_maps,
+        'downcam.rectify_pair': lambda: rectify_pair(left, right, left_maps, right_maps),
+    }
+
+
+BENCHMARK_GROUPS = [setup_single_device, setup_multi_device, setup_polarized_image, setup_helios, setup_downcam]
+
+
+def time_function(function, repeat=20, warmup=2):
+    for _ in range(warmup):
+        function()
+    samples = np.empty(repeat, dtype=np.int64)
+    for index in range(repeat):
+        start_ns = time.perf_counter_ns()
+        function()
+        samples[index] = time.perf_counter_ns() - start_ns
+    return {'repeat': repeat,
+            'min_ms': samples.min() / 1e6,
+            'median_ms': float(np.median(samples)) / 1e6,
+            'mean_ms': samples.mean() / 1e6,
+            'p90_ms': float(np.percentile(samples, 90)) / 1e6}
+
+
+def run_suite(pattern=None, repeat=20):
+    """
+    Runs every benchmark whose name contains pattern. Groups whose module
+    cannot be imported here (e.g. without arena_api) are reported as
+    skipped. Saved images go to a temporary directory that is removed
+    afterwards, and the logger is muted while timing.
+    """
+    from log_queue import get_logger
+
+    logger = get_logger()
+    results = {}
+    skipped = {}
+    with tempfile.TemporaryDirectory(prefix='benchmark_') as temp_dir:
+        for setup in BENCHMARK_GROUPS:
+            try:
+                benchmarks = setup(temp_dir)
+            except ImportError as exception:
+                skipped[setup.__name__] = str(exception)
+                continue
+            for name, function in benchmarks.items():
+                if pattern is not None and pattern not in name:
+                    continue
+                logger.muted = True
+                try:
+                    results[name] = time_function(function, repeat)
+                finally:
+                    logger.muted = False
+                print(f'''{name:<36} median {results[name]['median_ms']:9.3f} ms  '''
+                      f'''p90 {results[name]['p90_ms']:9.3f} ms''')
+    for name, reason in skipped.items():
+        print(f'{name:<36} skipped: {reason}')
+    return {'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'machine': {'platform': platform.platform(),
+                        'processor': platform.processor(),
+                        'cpu_count': os.cpu_count(),
+                        'python': platform.python_version(),
+                        'numpy': np.__version__,
+                        'opencv': cv2.__version__},
+            'results': results,
+            'skipped': skipped}
+
+
+def compare(report, baseline, tolerance=REGRESSION_TOLERANCE):
+    """
+    Returns {name: median ratio} of the benchmarks slower than the
+    baseline by more than tolerance.
+    """
+    regressions = {}
+    for name, result in report['results'].items():
+        reference = baseline['results'].get(name)
+        if reference is None or not reference['median_ms']:
+            continue
+        ratio = result['median_ms'] / reference['median_ms']
+        print(f'{name:<36} {ratio:6.2f}x baseline')
+        if ratio > 1 + tolerance:
+            regressions[name] = ratio
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks of the processing stages on synthetic frames')
+    parser.add_argument('--filter', default=None, help='only run benchmarks containing this text')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=None, help='results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args()
+
+    report = run_suite(args.filter, args.repeat)
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f'Results written to {args.output}')
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            regressions = compare(report, json.load(file), args.tolerance)
+        if regressions:
+            print(f'{len(regressions)} regression(s): {", ".join(regressions)}')
+            sys.exit(1)
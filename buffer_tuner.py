@@ -0,0 +1,99 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+import math
+import time
+
+from stage_timing import LatencyHistogram
+from stream_stats import read_stream_counters
+
+
+class BufferCountTuner:
+    """
+    Picks the stream buffer count from what the consumer actually does.
+    The stream starts with initial_count buffers; during the warm-up window
+    the time the acquisition thread needs per frame before it asks for the
+    next one (got_buffer to the next ready) is recorded. The buffer itself
+    may go back right after a copy, but while the thread converts and
+    publishes the frame the driver queues the arriving frames in stream
+    buffers, so this service time is where buffers pile up. By Little's law
+    frame rate * service time buffers are queued on average, so the count
+    that sustains the frame rate at the p99 service time is
+
+        ceil(frame rate * p99 dwell * safety) + 2
+
+    (one buffer being filled, one ready). Frames lost during warm-up mean
+    the initial count was already too small, so the result is never below
+    1.5 times that count then. The stream is restarted once with the result.
+    """
+
+    def __init__(self, device, initial_count=10, warmup_s=10.0, min_count=3, max_count=100,
+                 safety=1.5, frame_rate=None, log=print):
+        self.device = device
+        self.initial_count = initial_count
+        self.warmup_s = warmup_s
+        self.min_count = min_count
+        self.max_count = max_count
+        self.safety = safety
+        self.frame_rate = frame_rate
+        self.log = log
+        self.buffer_count = initial_count
+        self.dwell = LatencyHistogram()
+        self.tuned = False
+        self._warmup_end = None
+        self._lost_at_start = 0
+        self._got_ns = None
+
+    def _get_lost_frames(self):
+        counters = read_stream_counters(self.device.tl_stream_nodemap, ['StreamLostFrameCount'])
+        return counters.get('StreamLostFrameCount', 0)
+
+    def start(self):
+        self.device.start_stream(self.initial_count)
+        self._lost_at_start = self._get_lost_frames()
+        self._warmup_end = time.monotonic() + self.warmup_s
+
+    def got_buffer(self):
+        self._got_ns = time.perf_counter_ns()
+
+    def ready(self):
+        """
+        Call right before get_buffer. Once the warm-up window has passed
+        this computes the buffer count and restarts the stream with it.
+        """
+        if self.tuned or self._got_ns is None:
+            return
+        self.dwell.record(time.perf_counter_ns() - self._got_ns)
+        self._got_ns = None
+        if time.monotonic() >= self._warmup_end:
+            self.tune()
+
+    def get_buffer_count(self, frame_rate, p99_dwell_s, lost_frames):
+        count = math.ceil(frame_rate * p99_dwell_s * self.safety) + 2
+        if lost_frames > 0:
+            count = max(count, math.ceil(self.initial_count * 1.5))
+        return min(max(count, self.min_count), self.max_count)
+
+    def tune(self):
+        frame_rate = self.frame_rate
+        if frame_rate is None:
+            frame_rate = self.device.nodemap['AcquisitionFrameRate'].value
+        p99_dwell_s = self.dwell.get_percentile(99) / 1e9
+        lost_frames = self._get_lost_frames() - self._lost_at_start
+        self.buffer_count = self.get_buffer_count(frame_rate, p99_dwell_s, lost_frames)
+        self.tuned = True
+        serial = self.device.nodemap['DeviceSerialNumber'].value
+        p50_dwell_s = self.dwell.get_percentile(50) / 1e9
+        if p50_dwell_s * frame_rate > 1:
+            # buffers absorb stalls, not a thread that is slow on average
+            self.log(f'{serial}: p50 service time {p50_dwell_s * 1000:.1f} ms is longer than the frame '
+                     f'interval at {frame_rate:.1f} fps, frames will be dropped whatever the buffer count')
+        self.log(f'{serial}: {self.dwell.total_count} frames warm-up, p99 service time {p99_dwell_s * 1000:.1f} ms '
+                 f'at {frame_rate:.1f} fps, {lost_frames} lost -> {self.buffer_count} buffers '
+                 f'(was {self.initial_count})')
+        if self.buffer_count != self.initial_count:
+            self.device.stop_stream()
+            self.device.start_stream(self.buffer_count)
+
+    def stop(self):
+        self.device.stop_stream()
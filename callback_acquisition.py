@@ -0,0 +1,203 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+import collections
+import threading
+import time
+
+import numpy as np
+from arena_api.callback import callback, callback_function
+
+
+class SpscRing:
+    """
+    Lock-free single producer / single consumer ring of slot indexes.
+    Only the producer moves tail and only the consumer moves head, so with
+    the GIL making each index store atomic no lock is needed.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._items = [None] * capacity
+        self._head = 0
+        self._tail = 0
+
+    def push(self, item):
+        if self._tail - self._head >= self.capacity:
+            return False
+        self._items[self._tail % self.capacity] = item
+        self._tail += 1
+        return True
+
+    def pop(self):
+        if self._head == self._tail:
+            return None
+        item = self._items[self._head % self.capacity]
+        self._head += 1
+        return item
+
+    def __len__(self):
+        return self._tail - self._head
+
+
+class LatencyStats:
+    """
+    Keeps the last window latency samples (ns) in a preallocated array.
+    """
+
+    def __init__(self, window=4096):
+        self.samples = np.zeros(window, dtype=np.int64)
+        self.count = 0
+        self.max_ns = 0
+
+    def add(self, value_ns):
+        self.samples[self.count % len(self.samples)] = value_ns
+        self.count += 1
+        if value_ns > self.max_ns:
+            self.max_ns = value_ns
+
+    def summary_us(self):
+        samples = self.samples[:min(self.count, len(self.samples))]
+        if not len(samples):
+            return {'count': 0}
+        p50, p99 = np.percentile(samples, [50, 99]) / 1000
+        return {'count': self.count, 'p50_us': p50, 'p99_us': p99, 'max_us': self.max_ns / 1000}
+
+
+# device.on_buffer decorator requires buffer as its first positional parameter
+@callback_function.device.on_buffer
+def on_buffer(buffer, *args, **kwargs):
+    kwargs['acquisition'].handle_buffer(buffer)
+
+
+class CallbackAcquisition:
+    """
+    Acquisition driven by the on_buffer callback of
+    examples/py_callback_on_buffer.py instead of a get_buffer loop.
+    The callback only copies the image into a free pool slot and pushes
+    the slot index into the SPSC ring of the least busy worker, so the
+    driver gets its buffer back immediately. Each worker is the single
+    consumer of its own ring and sleeps on a semaphore the callback
+    releases, so a slot reaches process(image, frame_id, timestamp_ns)
+    without polling or a shared locked queue. Incomplete buffers are
+    counted and skipped.
+    """
+
+    def __init__(self, device, process, workers=2, pool_size=16):
+        self.device = device
+        self.process = process
+        self.workers = workers
+        self.pool_size = pool_size
+        self.slots = None
+        self.slot_info = [None] * pool_size
+        self.free_slots = collections.deque(range(pool_size))
+        self.rings = [SpscRing(pool_size) for _ in range(workers)]
+        self.wakeups = [threading.Semaphore(0) for _ in range(workers)]
+        self.callback_stats = LatencyStats()
+        self.queue_stats = LatencyStats()
+        self.received_count = 0
+        self.incomplete_count = 0
+        self.dropped_count = 0
+        self.processed_count = 0
+        self._handle = None
+        self._workers = []
+        self._running = threading.Event()
+        self._count_lock = threading.Lock()
+
+    def _allocate(self, buffer):
+        bytes_per_pixel = int(buffer.bits_per_pixel / 8)
+        self.slots = np.empty((self.pool_size, buffer.height, buffer.width, bytes_per_pixel),
+                              dtype=np.uint8)
+
+    def handle_buffer(self, buffer):
+        # runs on the driver's thread: copy, enqueue, return
+        start_ns = time.perf_counter_ns()
+        self.received_count += 1
+        if buffer.is_incomplete:
+            # counted by the stream statistics as well, not worth processing
+            self.incomplete_count += 1
+            return
+        if self.slots is None:
+            self._allocate(buffer)
+        try:
+            slot = self.free_slots.popleft()
+        except IndexError:
+            self.dropped_count += 1
+            return
+        image = self.slots[slot]
+        np.copyto(image, np.ctypeslib.as_array(buffer.pdata, image.shape))
+        self.slot_info[slot] = (buffer.frame_id, buffer.timestamp_ns, time.perf_counter_ns())
+        # a ring holds pool_size slots, so the push cannot fail
+        worker = min(range(self.workers), key=lambda index: len(self.rings[index]))
+        self.rings[worker].push(slot)
+        self.wakeups[worker].release()
+        self.callback_stats.add(time.perf_counter_ns() - start_ns)
+
+    def _work(self, worker):
+        ring, wakeup = self.rings[worker], self.wakeups[worker]
+        while self._running.is_set() or len(ring):
+            wakeup.acquire()
+            slot = ring.pop()
+            if slot is not None:
+                self._process_slot(slot)
+
+    def _process_slot(self, slot):
+        frame_id, timestamp_ns, enqueued_ns = self.slot_info[slot]
+        queued_ns = time.perf_counter_ns() - enqueued_ns
+        try:
+            self.process(self.slots[slot], frame_id, timestamp_ns)
+        finally:
+            with self._count_lock:
+                self.queue_stats.add(queued_ns)
+                self.processed_count += 1
+            self.free_slots.append(slot)
+
+    def start(self, buffer_count=10):
+        self._running.set()
+        self._workers = [threading.Thread(target=self._work, args=(worker,), daemon=True,
+                                          name=f'callback-worker-{worker}')
+                         for worker in range(self.workers)]
+        for worker in self._workers:
+            worker.start()
+        self._handle = callback.register(self.device, on_buffer, acquisition=self)
+        self.device.start_stream(buffer_count)
+
+    def stop(self):
+        """
+        Stops the stream, then finishes the frames already copied.
+        """
+        self.device.stop_stream()
+        callback.deregister(self._handle)
+        self._running.clear()
+        for wakeup in self.wakeups:
+            # lets a worker waiting on an empty ring see the stop
+            wakeup.release()
+        for worker in self._workers:
+            worker.join()
+
+    def get_report(self):
+        return {'received': self.received_count,
+                'incomplete': self.incomplete_count,
+                'dropped': self.dropped_count,
+                'processed': self.processed_count,
+                'callback': self.callback_stats.summary_us(),
+                'queue': self.queue_stats.summary_us()}
+
+
+if __name__ == '__main__':
+    import py_acquisition_single_device as SingleDevice
+
+    devices = SingleDevice.create_devices_with_tries()
+    device = devices[0]
+    SingleDevice.configure_some_nodes(device)
+    save_dir = device.nodemap['DeviceSerialNumber'].value
+
+    def demosaic_and_save(image, frame_id, timestamp_ns):
+        if frame_id % 50 == 0:
+            SingleDevice.save_images(image, save_dir)
+
+    acquisition = CallbackAcquisition(device, demosaic_and_save, workers=4)
+    acquisition.start()
+    time.sleep(10)
+    acquisition.stop()
+    print(acquisition.get_report())
@@ -0,0 +1,131 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+import queue
+import threading
+import zlib
+
+import numpy as np
+
+# Chunks enabled on the device ('ChunkSelector' values)
+FRAME_CHUNKS = ['Timestamp', 'ExposureTime', 'Gain', 'SequencerSetActive', 'CRC']
+
+
+def enable_frame_chunks(nodemap, chunk_names=FRAME_CHUNKS):
+    """
+    Activates chunk mode and enables the given chunks, skipping the ones the
+    device does not offer (e.g. SequencerSetActive on older firmware).
+    Returns the enabled chunk names.
+    """
+    nodemap['ChunkModeActive'].value = True
+    chunk_selector_node = nodemap['ChunkSelector']
+    chunk_enable_node = nodemap['ChunkEnable']
+    enabled = []
+    for chunk_name in chunk_names:
+        try:
+            chunk_selector_node.value = chunk_name
+        except (ValueError, KeyError):
+            continue
+        chunk_enable_node.value = True
+        enabled.append(chunk_name)
+    return enabled
+
+
+class FrameMetadata:
+    """
+    Compact per frame record of the chunk data.
+    """
+    __slots__ = ('frame_id', 'timestamp_ns', 'exposure_us', 'gain',
+                 'sequencer_set', 'crc', 'crc_valid', 'is_incomplete')
+
+    def __init__(self, frame_id=0, timestamp_ns=0, exposure_us=0.0, gain=0.0,
+                 sequencer_set=-1, crc=None, is_incomplete=False):
+        self.frame_id = frame_id
+        self.timestamp_ns = timestamp_ns
+        self.exposure_us = exposure_us
+        self.gain = gain
+        self.sequencer_set = sequencer_set
+        self.crc = crc
+        # None until validated by a CrcValidator
+        self.crc_valid = None
+        self.is_incomplete = is_incomplete
+
+    def as_tuple(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return (f'FrameMetadata(frame_id={self.frame_id}, timestamp_ns={self.timestamp_ns}, '
+                f'exposure_us={self.exposure_us:.1f}, gain={self.gain:.2f}, '
+                f'sequencer_set={self.sequencer_set}, crc_valid={self.crc_valid})')
+
+
+class ChunkReader:
+    """
+    Extracts the frame metadata from buffers with a single get_chunk call.
+    The list of chunk node names is resolved once from the enabled chunks.
+    """
+
+    def __init__(self, enabled_chunks=FRAME_CHUNKS):
+        self.node_names = [f'Chunk{chunk_name}' for chunk_name in enabled_chunks]
+
+    def read(self, buffer):
+        metadata = FrameMetadata(frame_id=buffer.frame_id,
+                                 timestamp_ns=buffer.timestamp_ns,
+                                 is_incomplete=buffer.is_incomplete)
+        if metadata.is_incomplete:
+            # chunks of an incomplete buffer may be missing
+            return metadata
+        try:
+            chunks = buffer.get_chunk(self.node_names)
+        except ValueError:
+            return metadata
+        for node_name, node in chunks.items():
+            if node_name == 'ChunkTimestamp':
+                metadata.timestamp_ns = node.value
+            elif node_name == 'ChunkExposureTime':
+                metadata.exposure_us = node.value
+            elif node_name == 'ChunkGain':
+                metadata.gain = node.value
+            elif node_name == 'ChunkSequencerSetActive':
+                metadata.sequencer_set = node.value
+            elif node_name == 'ChunkCRC':
+                metadata.crc = node.value
+        return metadata
+
+
+class CrcValidator(threading.Thread):
+    """
+    Checks ChunkCRC (CRC-32 of the image data) on a worker thread.
+    submit copies the image bytes so the buffer can be requeued at once;
+    frames are skipped when the worker falls behind.
+    """
+
+    def __init__(self, max_queue_size=8):
+        super().__init__(daemon=True)
+        self.frames = queue.Queue(maxsize=max_queue_size)
+        self.checked_count = 0
+        self.failed_count = 0
+        self.skipped_count = 0
+
+    def submit(self, metadata, image):
+        if metadata.crc is None:
+            return
+        try:
+            self.frames.put_nowait((metadata, np.ascontiguousarray(image).copy()))
+        except queue.Full:
+            self.skipped_count += 1
+
+    def stop(self):
+        self.frames.put(None)
+        self.join()
+
+    def run(self):
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            metadata, image = frame
+            metadata.crc_valid = zlib.crc32(image) == metadata.crc
+            self.checked_count += 1
+            if not metadata.crc_valid:
+                self.failed_count += 1
@@ -0,0 +1,180 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+import queue
+import threading
+
+import cv2
+import numpy as np
+
+from pointcloud import get_coord3d_array, get_valid_mask
+
+
+def get_depth_image(buffer, decoder):
+    """
+    Returns the z channel of a Coord3D buffer as an (H, W) float32 depth
+    image in millimeters and the matching validity mask.
+    """
+    scale, offset = decoder.get_scales()
+    coord3d_array = get_coord3d_array(buffer, buffer.pixel_format.name)
+    valid = get_valid_mask(coord3d_array).reshape(buffer.height, buffer.width)
+    depth = np.multiply(coord3d_array[:, 2], scale[2], dtype=np.float32)
+    if coord3d_array.dtype == np.uint16:
+        depth += offset[2]
+    return depth.reshape(buffer.height, buffer.width), valid
+
+
+class DepthAccumulator:
+    """
+    Host side replacement for Scan3dImageAccumulation.
+    mode 'ema' keeps an exponential running mean (weight alpha for the new
+    frame), mode 'window' keeps the exact mean over the last window frames.
+    Both keep a per pixel count of valid samples and update in place.
+    """
+
+    def __init__(self, shape, mode='ema', alpha=0.25, window=4):
+        if mode not in ('ema', 'window'):
+            raise ValueError(f'Unknown accumulation mode {mode}')
+        self.mode = mode
+        self.alpha = alpha
+        self.window = window
+        self.mean = np.zeros(shape, dtype=np.float32)
+        self.count = np.zeros(shape, dtype=np.uint16)
+        self._delta = np.zeros(shape, dtype=np.float32)
+        if mode == 'window':
+            self._sum = np.zeros(shape, dtype=np.float32)
+            self._frames = np.zeros((window,) + tuple(shape), dtype=np.float32)
+            self._valid = np.zeros((window,) + tuple(shape), dtype=bool)
+            self._index = 0
+
+    def reset(self):
+        self.mean.fill(0)
+        self.count.fill(0)
+        if self.mode == 'window':
+            self._sum.fill(0)
+            self._frames.fill(0)
+            self._valid.fill(False)
+            self._index = 0
+
+    def update(self, depth, valid=None):
+        """
+        Adds a depth frame. Pixels outside valid (default: finite and > 0)
+        keep their previous mean.
+        """
+        if valid is None:
+            valid = np.isfinite(depth) & (depth > 0)
+        if self.mode == 'ema':
+            self._update_ema(depth, valid)
+        else:
+            self._update_window(depth, valid)
+        return self.mean
+
+    def _update_ema(self, depth, valid):
+        # first valid sample of a pixel initialises the mean directly
+        first = valid & (self.count == 0)
+        np.copyto(self.mean, depth, where=first)
+        np.subtract(depth, self.mean, out=self._delta)
+        self._delta *= self.alpha
+        np.add(self.mean, self._delta, out=self.mean, where=valid & ~first)
+        np.add(self.count, 1, out=self.count,
+               where=valid & (self.count < np.iinfo(np.uint16).max))
+
+    def _update_window(self, depth, valid):
+        # remove the frame leaving the window, then add the new one
+        outgoing = self._frames[self._index]
+        outgoing_valid = self._valid[self._index]
+        np.subtract(self._sum, outgoing, out=self._sum, where=outgoing_valid)
+        np.subtract(self.count, 1, out=self.count, where=outgoing_valid)
+        np.copyto(outgoing, depth, where=valid)
+        np.copyto(outgoing_valid, valid)
+        np.add(self._sum, outgoing, out=self._sum, where=valid)
+        np.add(self.count, 1, out=self.count, where=valid)
+        self._index = (self._index + 1) % self.window
+        np.divide(self._sum, self.count, out=self.mean, where=self.count > 0)
+        self.mean[self.count == 0] = 0
+
+
+class SpatialFilterWorker(threading.Thread):
+    """
+    Runs an edge preserving bilateral filter on the latest accumulated depth
+    image on a worker thread. Only the newest submitted frame is filtered,
+    older pending frames are dropped so the filter never delays acquisition.
+    """
+
+    def __init__(self, diameter=5, sigma_depth=20.0, sigma_space=3.0):
+        super().__init__(daemon=True)
+        self.diameter = diameter
+        self.sigma_depth = sigma_depth
+        self.sigma_space = sigma_space
+        self.filtered_count = 0
+        self._pending = queue.Queue(maxsize=1)
+        self._result = None
+        self._result_lock = threading.Lock()
+
+    def submit(self, depth, count=None):
+        """
+        Hands a copy of the depth image (and validity count) to the worker.
+        """
+        frame = (depth.copy(), None if count is None else count > 0)
+        try:
+            self._pending.get_nowait()
+        except queue.Empty:
+            pass
+        self._pending.put(frame)
+
+    def get_result(self):
+        """
+        Returns the most recent filtered depth image or None.
+        """
+        with self._result_lock:
+            return self._result
+
+    def stop(self):
+        """
+        Filters the pending frame and waits for the worker to finish.
+        """
+        self._pending.put(None)
+        self.join()
+
+    def run(self):
+        while True:
+            frame = self._pending.get()
+            if frame is None:
+                break
+            depth, valid = frame
+            filtered = cv2.bilateralFilter(depth, self.diameter,
+                                           self.sigma_depth, self.sigma_space)
+            if valid is not None:
+                filtered[~valid] = 0
+            with self._result_lock:
+                self._result = filtered
+            self.filtered_count += 1
+
+
+if __name__ == '__main__':
+    from pointcloud import Coord3dDecoder
+    from py_acquisition_single_device import create_devices_with_tries
+
+    devices = create_devices_with_tries()
+    device = devices[0]
+    nodemap = device.nodemap
+    nodemap['PixelFormat'].value = 'Coord3D_ABCY16'
+    # keep the camera at full rate, smoothing is done on the host
+    nodemap['Scan3dImageAccumulation'].value = 1
+    nodemap['Scan3dSpatialFilterEnable'].value = False
+    decoder = Coord3dDecoder(device)
+    spatial_filter = SpatialFilterWorker()
+    spatial_filter.start()
+    accumulator = None
+    with device.start_stream(10):
+        for _ in range(200):
+            buffer = device.get_buffer()
+            depth, valid = get_depth_image(buffer, decoder)
+            if accumulator is None:
+                accumulator = DepthAccumulator(depth.shape, mode='window', window=4)
+            accumulator.update(depth, valid)
+            device.requeue_buffer(buffer)
+            spatial_filter.submit(accumulator.mean, accumulator.count)
+    spatial_filter.stop()
+    cv2.imwrite('smooth_depth.png', spatial_filter.get_result().astype(np.uint16))
+    print(f'{spatial_filter.filtered_count} frames filtered')
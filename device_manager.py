@@ -0,0 +1,302 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+import threading
+import time
+
+from arena_api.callback import callback, callback_function
+from arena_api.system import system
+
+from log_queue import log_event
+from node_config import apply_node_config
+
+# Exponential backoff between two enumerations
+BACKOFF_INITIAL_S = 0.05
+BACKOFF_MAX_S = 1.0
+
+
+def poll_with_backoff(find, timeout_s=60, backoff_initial_s=BACKOFF_INITIAL_S,
+                      backoff_max_s=BACKOFF_MAX_S):
+    """
+    Calls find with the current system.device_infos until it returns
+    something other than None, sleeping with exponential backoff in
+    between. Raises TimeoutError after timeout_s.
+    """
+    delay = backoff_initial_s
+    start_time = time.monotonic()
+    while True:
+        result = find(system.device_infos)
+        if result is not None:
+            return result
+        if time.monotonic() - start_time >= timeout_s:
+            raise TimeoutError(f'No device found within {timeout_s} s!')
+        time.sleep(delay)
+        delay = min(delay * 2, backoff_max_s)
+
+
+def wait_for_device_infos(expected_serials=None, timeout_s=60):
+    """
+    Returns the device infos as soon as every expected serial is enumerated
+    (or as soon as any device is found when expected_serials is None).
+    """
+    missing = []
+
+    def find(device_infos):
+        if expected_serials is None:
+            return device_infos or None
+        found = {info['serial']: info for info in device_infos
+                 if info['serial'] in expected_serials}
+        if len(found) == len(expected_serials):
+            return [found[serial] for serial in expected_serials]
+        missing[:] = [serial for serial in expected_serials if serial not in found]
+        return None
+
+    try:
+        return poll_with_backoff(find, timeout_s)
+    except TimeoutError:
+        raise TimeoutError(f'No device found within {timeout_s} s! '
+                           f'Missing serials: {missing}') from None
+
+
+def create_devices_with_backoff(expected_serials=None, timeout_s=60):
+    """
+    Drop in replacement for create_devices_with_tries which returns as soon
+    as the cameras show up instead of sleeping in 10 second steps.
+    """
+    device_infos = wait_for_device_infos(expected_serials, timeout_s)
+    devices = system.create_device(device_infos=device_infos)
+    log_event('devices_created', f'Created {len(devices)} device(s)')
+    return devices
+
+
+class ManagedDevice:
+    """
+    Device handle that survives a disconnect.
+    The acquisition code uses it like a device; while the camera is
+    reconnected get_buffer raises TimeoutError after its timeout, like a
+    silent camera, and resumes on the new device handle once the stream has
+    been restarted. Once the reconnect gave up it raises ConnectionError.
+    Settings written after the configure callback (e.g. an acquisition
+    profile) are registered with register_node_config, so a reconnect
+    writes them again.
+    """
+
+    def __init__(self, manager, device, serial):
+        self.manager = manager
+        self.device = device
+        self.serial = serial
+        self.buffer_count = None
+        self.node_config = []
+        self.connected = threading.Event()
+        self.connected.set()
+        self.failed = False
+        self.callback_handle = None
+        self.disconnect_count = 0
+        self.downtime_s = []
+        self._disconnect_time = None
+
+    def __getattr__(self, name):
+        # nodemaps and everything else of the current handle
+        return getattr(self.device, name)
+
+    def register_node_config(self, node_config):
+        """
+        node_config is written to the new device handle after configure and
+        before the stream is restarted, replacing the registered one.
+        """
+        self.node_config = list(node_config)
+
+    def start_stream(self, buffer_count=10):
+        self.buffer_count = buffer_count
+        self.device.start_stream(buffer_count)
+
+    def stop_stream(self):
+        self.buffer_count = None
+        if self.connected.is_set() and not self.failed:
+            self.device.stop_stream()
+
+    def _is_handle_alive(self, device):
+        try:
+            return device.is_connected()
+        except Exception:
+            return False
+
+    def get_buffer(self, timeout=1000):
+        """
+        Returns the next buffer. Raises TimeoutError when none arrived within
+        timeout ms, also while the camera is reconnected, so the caller keeps
+        checking for shutdown; ConnectionError once the reconnect gave up.
+        """
+        if not self.connected.wait(timeout / 1000):
+            raise TimeoutError(f'Device {self.serial} is reconnecting')
+        if self.failed:
+            raise ConnectionError(f'Device {self.serial} did not reconnect')
+        device = self.device
+        try:
+            return device.get_buffer(timeout=timeout)
+        except TimeoutError:
+            raise
+        except Exception:
+            if device is not self.device:
+                # reconnected meanwhile, the next call uses the new handle
+                raise TimeoutError(f'Device {self.serial} was reconnected') from None
+            if self.connected.is_set() and self._is_handle_alive(device):
+                raise
+            # the handle died before the disconnect callback ran; start the
+            # reconnect here so the next call blocks on connected instead of
+            # failing on the dead handle again
+            if not self.manager.handle_disconnect(self):
+                raise ConnectionError(f'Device {self.serial} disconnected') from None
+            raise TimeoutError(f'Device {self.serial} disconnected') from None
+
+    def requeue_buffer(self, buffer):
+        # buffers of a dead handle must not be requeued on the new one
+        try:
+            self.device.requeue_buffer(buffer)
+        except Exception:
+            if self.connected.is_set():
+                raise
+
+    def on_disconnected(self):
+        self.connected.clear()
+        self.disconnect_count += 1
+        self._disconnect_time = time.monotonic()
+
+    def on_reconnected(self, device):
+        self.device = device
+        self.downtime_s.append(time.monotonic() - self._disconnect_time)
+        self.connected.set()
+
+    def on_failed(self):
+        # wakes get_buffer, which raises ConnectionError from now on
+        self.failed = True
+        self.connected.set()
+
+    def get_metrics(self):
+        return {'disconnects': self.disconnect_count,
+                'total_downtime_s': sum(self.downtime_s),
+                'max_downtime_s': max(self.downtime_s, default=0.0)}
+
+
+class DeviceManager:
+    """
+    Creates the devices of a rig and transparently recreates them when they
+    disconnect, using the system disconnect callback from
+    examples/py_callback_on_device_disconnected.py.
+    configure is called with the raw arena device after every reconnect,
+    followed by the node config registered with the ManagedDevice, before
+    its stream is restarted; the first configuration is left to the
+    caller, which may configure all cameras concurrently.
+    """
+
+    def __init__(self, expected_serials=None, configure=None, timeout_s=60,
+                 reconnect_timeout_s=300):
+        self.expected_serials = expected_serials
+        self.configure = configure
+        self.timeout_s = timeout_s
+        self.reconnect_timeout_s = reconnect_timeout_s
+        self.devices = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def open(self, device_infos=None):
+        """
+        Waits for the expected cameras (or takes device_infos that were
+        already discovered) and returns them as ManagedDevices.
+        """
+        if device_infos is None:
+            device_infos = wait_for_device_infos(self.expected_serials, self.timeout_s)
+        devices = system.create_device(device_infos=device_infos)
+        for device_info, device in zip(device_infos, devices):
+            managed = ManagedDevice(self, device, device_info['serial'])
+            self._watch(managed)
+            self.devices[managed.serial] = managed
+        log_event('devices_created', f'Created {len(devices)} managed device(s)')
+        return list(self.devices.values())
+
+    def _watch(self, managed):
+        @callback_function.system.on_device_disconnected
+        def on_device_disconnected(device):
+            self.handle_disconnect(managed)
+
+        managed.callback_handle = callback.register(
+            system, on_device_disconnected, watched_device=managed.device)
+
+    def handle_disconnect(self, managed):
+        """
+        Starts the reconnect of managed, called by the disconnect callback or
+        by get_buffer when the handle died first. Returns False when the
+        manager is closed and nothing will be reconnected.
+        """
+        # the callback runs on the arena thread, reconnect elsewhere
+        with self._lock:
+            if self._closed:
+                return False
+            if not managed.connected.is_set() or managed.failed:
+                return True
+            managed.on_disconnected()
+        log_event('disconnected', 'reconnecting', device=managed.serial, level='WARNING')
+        threading.Thread(target=self._reconnect, args=(managed,), daemon=True).start()
+        return True
+
+    def _reconnect(self, managed):
+        callback.deregister(managed.callback_handle)
+        try:
+            system.destroy_device(managed.device)
+        except Exception:
+            pass
+        deadline = time.monotonic() + self.reconnect_timeout_s
+        delay = BACKOFF_INITIAL_S
+        while not self._closed:
+            device = None
+            try:
+                device_infos = wait_for_device_infos([managed.serial],
+                                                     max(0.0, deadline - time.monotonic()))
+                device = system.create_device(device_infos=device_infos)[0]
+                if self.configure is not None:
+                    self.configure(device)
+                apply_node_config(device, managed.node_config)
+                if managed.buffer_count is not None:
+                    device.start_stream(managed.buffer_count)
+                break
+            except Exception as exception:
+                # enumerated but not usable yet (still booting, IP conflict, ...)
+                log_event('reconnect_failed', str(exception), device=managed.serial, level='WARNING')
+                if device is not None:
+                    try:
+                        system.destroy_device(device)
+                    except Exception:
+                        pass
+                if isinstance(exception, TimeoutError) or time.monotonic() >= deadline:
+                    log_event('reconnect_gave_up', f'after {self.reconnect_timeout_s} s',
+                              device=managed.serial, level='ERROR')
+                    managed.on_failed()
+                    return
+                time.sleep(delay)
+                delay = min(delay * 2, BACKOFF_MAX_S)
+        else:
+            return
+        managed.on_reconnected(device)
+        self._watch(managed)
+        log_event('reconnected', f'after {managed.downtime_s[-1]:.2f} s', device=managed.serial)
+
+    def get_metrics(self):
+        return {serial: managed.get_metrics() for serial, managed in self.devices.items()}
+
+    def close(self):
+        """
+        Stops reconnecting, logs the disconnect and downtime metrics of every
+        device and destroys the devices.
+        """
+        with self._lock:
+            self._closed = True
+        for serial, metrics in self.get_metrics().items():
+            log_event('device_metrics', f'''{metrics['disconnects']} disconnect(s), '''
+                                        f'''{metrics['total_downtime_s']:.2f} s down, '''
+                                        f'''longest {metrics['max_downtime_s']:.2f} s''',
+                      device=serial, **metrics)
+        for managed in self.devices.values():
+            callback.deregister(managed.callback_handle)
+            if managed.buffer_count is not None:
+                managed.stop_stream()
+        system.destroy_device()
@@ -0,0 +1,124 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+import threading
+
+# Nodes that never change while the device is open
+STATIC_NODES = {
+    'DeviceModelName',
+    'DeviceSerialNumber',
+    'DeviceVendorName',
+    'DeviceFirmwareVersion',
+    'DeviceUserID',
+    'GevMACAddress',
+    'SensorWidth',
+    'SensorHeight',
+    'WidthMax',
+    'HeightMax',
+    'GevTimestampTickFrequency',
+}
+
+# Cached nodes that must be read again after one of the written nodes changed
+NODE_DEPENDENCIES = {
+    'PixelFormat': {'Width', 'Height', 'PayloadSize', 'AcquisitionFrameRate',
+                    'Scan3dCoordinateScale', 'Scan3dCoordinateOffset'},
+    'Width': {'PayloadSize', 'AcquisitionFrameRate'},
+    'Height': {'PayloadSize', 'AcquisitionFrameRate'},
+    'OffsetX': set(),
+    'OffsetY': set(),
+    'BinningHorizontal': {'Width', 'WidthMax', 'PayloadSize', 'AcquisitionFrameRate'},
+    'BinningVertical': {'Height', 'HeightMax', 'PayloadSize', 'AcquisitionFrameRate'},
+    'ExposureTime': {'AcquisitionFrameRate'},
+    'ChunkModeActive': {'PayloadSize'},
+    'ChunkEnable': {'PayloadSize'},
+    'Scan3dOperatingMode': {'Scan3dCoordinateScale', 'Scan3dCoordinateOffset',
+                            'AcquisitionFrameRate'},
+}
+
+# Nodes that are cached as well, until a dependency above invalidates them
+RARELY_CHANGING_NODES = {'Width', 'Height', 'PixelFormat', 'PayloadSize',
+                         'Scan3dOperatingMode'}
+
+
+class CachedDevice:
+    """
+    Device wrapper that reads static and rarely changing nodes only once.
+    Writes through set() invalidate the cached nodes that depend on the
+    written node. Everything else is forwarded to the wrapped device, so
+    the wrapper can be passed where a device is expected.
+    """
+
+    def __init__(self, device, cached_nodes=STATIC_NODES | RARELY_CHANGING_NODES):
+        self.device = device
+        self.cached_nodes = set(cached_nodes)
+        self._cache = {}
+        self._coordinate_cache = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.device, name)
+
+    def get(self, node_name):
+        """
+        Returns the node value, from the cache when the node is cacheable.
+        """
+        if node_name not in self.cached_nodes:
+            return self.device.nodemap[node_name].value
+        try:
+            return self._cache[node_name]
+        except KeyError:
+            pass
+        value = self.device.nodemap[node_name].value
+        with self._lock:
+            self._cache[node_name] = value
+        return value
+
+    def set(self, node_name, value):
+        """
+        Writes a node and invalidates the cached nodes depending on it.
+        """
+        self.device.nodemap[node_name].value = value
+        self.invalidate(node_name)
+
+    def invalidate(self, node_name=None):
+        """
+        Drops node_name and its dependents from the cache, or everything.
+        """
+        with self._lock:
+            if node_name is None:
+                self._cache.clear()
+                self._coordinate_cache.clear()
+                return
+            self._cache.pop(node_name, None)
+            for dependent in NODE_DEPENDENCIES.get(node_name, ()):
+                self._cache.pop(dependent, None)
+                if dependent.startswith('Scan3dCoordinate'):
+                    self._coordinate_cache.clear()
+
+    def get_coordinate(self, coordinate):
+        """
+        Returns the cached (scale, offset) of a Scan3dCoordinateSelector
+        entry ('CoordinateA', 'CoordinateB' or 'CoordinateC').
+        """
+        try:
+            return self._coordinate_cache[coordinate]
+        except KeyError:
+            pass
+        nodemap = self.device.nodemap
+        with self._lock:
+            selector_node = nodemap['Scan3dCoordinateSelector']
+            selector_initial = selector_node.value
+            selector_node.value = coordinate
+            value = (nodemap['Scan3dCoordinateScale'].value,
+                     nodemap['Scan3dCoordinateOffset'].value)
+            selector_node.value = selector_initial
+            self._coordinate_cache[coordinate] = value
+        return value
+
+    @property
+    def thread_id(self):
+        """
+        '<model>-<serial>', the name the acquisition scripts use for windows
+        and save directories.
+        """
+        return f'''{self.get('DeviceModelName')}-{self.get('DeviceSerialNumber')}'''
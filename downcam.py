@@ -4,12 +4,18 @@ import numpy as np
 
 matplotlib.use('Agg')
 
+IMAGE_SIZE = (1224, 1024)  # 图像尺寸
+
 
 def f_1(x, A, B):
     return A * x + B
 
 
-if __name__ == '__main__':
+def get_stereo_calibration():
+    """
+    Returns the calibration of the left/right rig: camera matrices,
+    distortions, R and T.
+    """
     left_camera_matrix = np.array([[8.995005273265216e+02, 0, 0],
                                    [0.165559863153613, 8.994060391394378e+02, 0],
                                    [6.213816830168396e+02, 5.034540671546230e+02, 1]])
@@ -25,20 +31,42 @@ if __name__ == '__main__':
                   [0.0170, 0.9998, -0.0036],
                   [0.0171, 0.0033, 0.9998]])
     R = R.T
-    T = np.array([-46.3535, -7.0962, 13.6637])
-    size = (1224, 1024)  # 图像尺寸
+    T = np.array([[-46.3535], [-7.0962], [13.6637]])
+    return left_camera_matrix, left_distortion, right_camera_matrix, right_distortion, R, T
+
+
+def get_rectify_maps(size=IMAGE_SIZE):
+    """
+    Returns the left and right remap tables, the focal length and the
+    baseline in meters. The maps only depend on the calibration, so they are
+    computed once and reused for every pair.
+    """
+    left_camera_matrix, left_distortion, right_camera_matrix, right_distortion, R, T = get_stereo_calibration()
     R1, R2, P1, P2, Q, validPixROI1, validPixROI2 = cv2.stereoRectify(left_camera_matrix, left_distortion, right_camera_matrix, right_distortion, size, R, T)
     left_map1, left_map2 = cv2.initUndistortRectifyMap(left_camera_matrix, left_distortion, R1, P1, size, cv2.CV_16SC2)
     right_map1, right_map2 = cv2.initUndistortRectifyMap(right_camera_matrix, right_distortion, R2, P2, size, cv2.CV_16SC2)
     focal_length = Q[2][-1]
-    Baseline = np.abs(T[0]) / 1000
+    Baseline = np.abs(T[0][0]) / 1000
+    return (left_map1, left_map2), (right_map1, right_map2), focal_length, Baseline
 
-    left_images = cv2.imread('./TRI050S-Q-194100034/2021-12-11(degree0)/21-12-11-15-06-32-587526_0.png')
-    right_images = cv2.imread('./TRI050S-Q-194100036/2021-12-11(degree0)/21-12-11-15-06-33-616783_0.png')
+
+def rectify_pair(left_images, right_images, left_maps, right_maps):
+    """
+    Rectifies a stereo pair and returns both side by side.
+    """
     imageH, imageW, _ = left_images.shape
-    left_rec = cv2.remap(left_images, left_map1, left_map2, cv2.INTER_LINEAR)
-    right_rec = cv2.remap(right_images, right_map1, right_map2, cv2.INTER_LINEAR)
+    left_rec = cv2.remap(left_images, left_maps[0], left_maps[1], cv2.INTER_LINEAR)
+    right_rec = cv2.remap(right_images, right_maps[0], right_maps[1], cv2.INTER_LINEAR)
     image_rec = np.zeros((imageH, imageW * 2, 3))
     image_rec[:, :imageW] = left_rec
     image_rec[:, imageW:] = right_rec
+    return image_rec
+
+
+if __name__ == '__main__':
+    left_maps, right_maps, focal_length, Baseline = get_rectify_maps()
+
+    left_images = cv2.imread('./TRI050S-Q-194100034/2021-12-11(degree0)/21-12-11-15-06-32-587526_0.png')
+    right_images = cv2.imread('./TRI050S-Q-194100036/2021-12-11(degree0)/21-12-11-15-06-33-616783_0.png')
+    image_rec = rectify_pair(left_images, right_images, left_maps, right_maps)
     cv2.imwrite('rec.png', image_rec)
@@ -0,0 +1,146 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+import collections
+import threading
+
+import numpy as np
+
+PAGE_SIZE = 4096
+
+
+def get_aligned_array(number_of_bytes, alignment=PAGE_SIZE):
+    """
+    Returns a uint8 array of number_of_bytes whose data starts on an
+    alignment boundary.
+    """
+    raw = np.empty(number_of_bytes + alignment, dtype=np.uint8)
+    offset = -raw.ctypes.data % alignment
+    return raw[offset:offset + number_of_bytes]
+
+
+class PooledFrame:
+    """
+    One slot of a FramePool holding a copy of a raw frame. The slot goes
+    back to the pool when the last holder calls release(); retain() adds a
+    holder without copying. Can be used as a context manager.
+    """
+    __slots__ = ('pool', 'slot', 'array', 'frame_id', 'timestamp_ns', 'metadata', '_references')
+
+    def __init__(self, pool, slot, array):
+        self.pool = pool
+        self.slot = slot
+        self.array = array
+        self.frame_id = 0
+        self.timestamp_ns = 0
+        self.metadata = None
+        self._references = 0
+
+    def retain(self):
+        with self.pool.lock:
+            if self._references <= 0:
+                raise ValueError('Frame was already returned to the pool')
+            self._references += 1
+        return self
+
+    def release(self):
+        with self.pool.lock:
+            self._references -= 1
+            if self._references == 0:
+                self.metadata = None
+                self.pool.free_slots.append(self.slot)
+                self.pool.lock.notify()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+
+class FramePool:
+    """
+    Preallocated frames of one device in a single page aligned block.
+    copy_from() copies a buffer into a free slot with one memcpy, so the
+    buffer can be requeued at once while consumers keep the raw frame for
+    as long as they hold a reference. After the pool is allocated no
+    further arrays are created.
+    """
+
+    def __init__(self, shape, dtype=np.uint8, size=16, alignment=PAGE_SIZE):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.size = size
+        frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        # every slot starts on a page boundary
+        stride = -(-frame_bytes // alignment) * alignment
+        self.memory = get_aligned_array(stride * size, alignment)
+        self.frames = [PooledFrame(self, slot, self.memory[slot * stride:slot * stride + frame_bytes]
+                                   .view(self.dtype).reshape(self.shape))
+                       for slot in range(size)]
+        self.free_slots = collections.deque(range(size))
+        self.lock = threading.Condition()
+        self.exhausted_count = 0
+
+    @classmethod
+    def for_buffer(cls, buffer, size=16):
+        bytes_per_pixel = int(buffer.bits_per_pixel / 8)
+        return cls((buffer.height, buffer.width, bytes_per_pixel), np.uint8, size)
+
+    def acquire(self, timeout=None):
+        """
+        Returns a free frame holding one reference, or None when every slot
+        is still in use after timeout seconds (0 does not wait).
+        """
+        with self.lock:
+            if not self.free_slots and (timeout == 0 or
+                                        not self.lock.wait_for(lambda: self.free_slots, timeout)):
+                self.exhausted_count += 1
+                return None
+            frame = self.frames[self.free_slots.popleft()]
+            frame._references = 1
+        return frame
+
+    def copy_from(self, source, frame_id=0, timestamp_ns=0, timeout=0):
+        """
+        Copies an array or an arena buffer into a pool frame.
+        """
+        frame = self.acquire(timeout)
+        if frame is None:
+            return None
+        if hasattr(source, 'pdata'):
+            frame_id, timestamp_ns = source.frame_id, source.timestamp_ns
+            source = np.ctypeslib.as_array(source.pdata, self.shape)
+        np.copyto(frame.array, source)
+        frame.frame_id = frame_id
+        frame.timestamp_ns = timestamp_ns
+        return frame
+
+    def get_free_count(self):
+        return len(self.free_slots)
+
+
+class LatestFrame:
+    """
+    Holds the newest frame of a device for other threads. publish() hands
+    over the producer's reference and drops the previous frame; get()
+    returns the current frame with a reference of its own, so it cannot be
+    recycled while the reader uses it.
+    """
+
+    def __init__(self):
+        self._frame = None
+        self._lock = threading.Lock()
+
+    def publish(self, frame):
+        with self._lock:
+            previous, self._frame = self._frame, frame
+        if previous is not None:
+            previous.release()
+
+    def get(self):
+        with self._lock:
+            return None if self._frame is None else self._frame.retain()
+
+    def clear(self):
+        self.publish(None)
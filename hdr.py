@@ -0,0 +1,191 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+import numpy as np
+
+from log_queue import log_event
+
+# Exposure times in microseconds of the sequencer sets, short to long
+HDR_EXPOSURE_TIMES_US = [2500.0, 5000.0, 100000.0]
+# 8 bit values at or above this are treated as saturated
+SATURATION_LEVEL = 250
+
+
+def get_weight_lut(bit_depth=8, saturation_level=SATURATION_LEVEL):
+    """
+    Hat weighting over the pixel values: mid tones are trusted most, the
+    noisy dark end and saturated values get little or no weight.
+    """
+    max_value = (1 << bit_depth) - 1
+    values = np.arange(max_value + 1, dtype=np.float32)
+    weight = np.minimum(values, max_value - values) / (max_value / 2)
+    weight[values >= saturation_level * (max_value / 255)] = 0
+    return np.maximum(weight, 0).astype(np.float32)
+
+
+def configure_hdr_sequencer(nodemap, exposure_times_us=HDR_EXPOSURE_TIMES_US):
+    """
+    Sets up one sequencer set per exposure time, cycling through all of
+    them, as in examples/py_sequencer_HDR.py. Exposure times outside the
+    ExposureTime range of the current frame rate are clamped, as in the
+    example. Chunk data carries the active set and exposure time with each
+    frame. Returns the exposure times actually set.
+    """
+    if nodemap['SequencerMode'].value == 'On':
+        nodemap['SequencerMode'].value = 'Off'
+    nodemap['ExposureAuto'].value = 'Off'
+    nodemap['SequencerConfigurationMode'].value = 'On'
+    number_of_sets = len(exposure_times_us)
+    applied_times_us = []
+    for set_number, exposure_time in enumerate(exposure_times_us):
+        nodemap['SequencerSetSelector'].value = set_number
+        nodemap['SequencerFeatureSelector'].value = 'ExposureTime'
+        exposure_node = nodemap['ExposureTime']
+        clamped_time = min(max(float(exposure_time), exposure_node.min), exposure_node.max)
+        if clamped_time != exposure_time:
+            log_event('hdr_exposure_clamped', f'set {set_number}: {exposure_time} us -> {clamped_time} us',
+                      level='WARNING', min_us=exposure_node.min, max_us=exposure_node.max)
+        exposure_node.value = clamped_time
+        applied_times_us.append(clamped_time)
+        nodemap['SequencerPathSelector'].value = 0
+        nodemap['SequencerSetNext'].value = (set_number + 1) % number_of_sets
+        nodemap['SequencerTriggerSource'].value = 'FrameStart'
+        nodemap['SequencerSetSave'].execute()
+    nodemap['SequencerSetStart'].value = 0
+    nodemap['SequencerConfigurationMode'].value = 'Off'
+
+    nodemap['ChunkModeActive'].value = True
+    for chunk_name in ['SequencerSetActive', 'ExposureTime']:
+        nodemap['ChunkSelector'].value = chunk_name
+        nodemap['ChunkEnable'].value = True
+    nodemap['SequencerMode'].value = 'On'
+    return applied_times_us
+
+
+def get_sequencer_chunks(buffer):
+    """
+    Returns (sequencer set, exposure time in us) of a buffer.
+    """
+    chunks = buffer.get_chunk(['ChunkSequencerSetActive', 'ChunkExposureTime'])
+    return chunks['ChunkSequencerSetActive'].value, chunks['ChunkExposureTime'].value
+
+
+class HdrFusion:
+    """
+    Merges the frames of one sequencer cycle into a radiance estimate
+    (value per microsecond of exposure), separately for every
+    polarization channel of a (H, W, 4) PolarizedAngles frame.
+    Per exposure weighting uses lookup tables, so a merge costs two table
+    lookups and two in place additions per frame, into preallocated
+    accumulators.
+    """
+
+    def __init__(self, shape, number_of_sets=len(HDR_EXPOSURE_TIMES_US), bit_depth=8,
+                 saturation_level=SATURATION_LEVEL):
+        self.shape = tuple(shape)
+        self.number_of_sets = number_of_sets
+        self.weight_lut = get_weight_lut(bit_depth, saturation_level)
+        self.values = np.arange(len(self.weight_lut), dtype=np.float32)
+        self.radiance = np.zeros(self.shape, dtype=np.float32)
+        self.weight_sum = np.zeros(self.shape, dtype=np.float32)
+        self.result = np.zeros(self.shape, dtype=np.float32)
+        self._lookup = np.zeros(self.shape, dtype=np.float32)
+        self._shortest = np.zeros(self.shape, dtype=np.float32)
+        self._luts = {}
+        self._received = set()
+        self._shortest_exposure = None
+        self.merged_count = 0
+        self.dropped_cycles = 0
+
+    def _get_lut(self, exposure_time_us):
+        # weighted radiance contribution of every pixel value at this exposure
+        lut = self._luts.get(exposure_time_us)
+        if lut is None:
+            lut = self.weight_lut * self.values / exposure_time_us
+            self._luts[exposure_time_us] = lut
+        return lut
+
+    def reset(self):
+        self.radiance.fill(0)
+        self.weight_sum.fill(0)
+        self._received.clear()
+        self._shortest_exposure = None
+
+    def add(self, frame, set_index, exposure_time_us):
+        """
+        Adds the frame of one sequencer set. Returns the merged radiance
+        once every set of the cycle has been added, otherwise None.
+        The returned array is reused by the next cycle.
+        """
+        if set_index in self._received:
+            # a frame of the previous cycle was lost, start over
+            self.dropped_cycles += 1
+            self.reset()
+        np.take(self._get_lut(exposure_time_us), frame, out=self._lookup)
+        self.radiance += self._lookup
+        np.take(self.weight_lut, frame, out=self._lookup)
+        self.weight_sum += self._lookup
+        if self._shortest_exposure is None or exposure_time_us < self._shortest_exposure:
+            # fallback for pixels saturated in every exposure
+            self._shortest_exposure = exposure_time_us
+            np.divide(frame, exposure_time_us, out=self._shortest, dtype=np.float32)
+        self._received.add(set_index)
+        if len(self._received) < self.number_of_sets:
+            return None
+        unweighted = self.weight_sum == 0
+        np.divide(self.radiance, self.weight_sum, out=self.result, where=~unweighted)
+        np.copyto(self.result, self._shortest, where=unweighted)
+        self.reset()
+        self.merged_count += 1
+        return self.result
+
+
+def get_stokes(radiance):
+    """
+    Returns S0, S1, S2 of a (H, W, 4) 0/45/90/135 degree radiance array.
+    """
+    i0, i45, i90, i135 = (radiance[:, :, index] for index in range(4))
+    s0 = (i0 + i45 + i90 + i135) * 0.5
+    s1 = i0 - i90
+    s2 = i45 - i135
+    return s0, s1, s2
+
+
+def get_dolp_aolp(radiance):
+    """
+    Degree (0..1) and angle (radians, -pi/2..pi/2) of linear polarization.
+    """
+    s0, s1, s2 = get_stokes(radiance)
+    dolp = np.divide(np.hypot(s1, s2), s0, out=np.zeros_like(s0), where=s0 > 0)
+    aolp = 0.5 * np.arctan2(s2, s1)
+    return dolp, aolp
+
+
+if __name__ == '__main__':
+    import cv2
+
+    from py_acquisition_single_device import configure_some_nodes, create_devices_with_tries
+
+    devices = create_devices_with_tries()
+    device = devices[0]
+    configure_some_nodes(device)
+    configure_hdr_sequencer(device.nodemap)
+    fusion = None
+    with device.start_stream(10):
+        while fusion is None or fusion.merged_count < 10:
+            buffer = device.get_buffer()
+            if buffer.is_incomplete:
+                device.requeue_buffer(buffer)
+                continue
+            set_index, exposure_time_us = get_sequencer_chunks(buffer)
+            frame = np.ctypeslib.as_array(buffer.pdata, (buffer.height, buffer.width, 4))
+            if fusion is None:
+                fusion = HdrFusion(frame.shape)
+            radiance = fusion.add(frame, set_index, exposure_time_us)
+            device.requeue_buffer(buffer)
+            if radiance is not None:
+                dolp, aolp = get_dolp_aolp(radiance)
+                cv2.imwrite(f'hdr_dolp_{fusion.merged_count}.png',
+                            cv2.cvtColor((dolp * 255).astype(np.uint8), cv2.COLOR_BayerRG2RGB))
+    device.nodemap['SequencerMode'].value = 'Off'
+    print(f'{fusion.merged_count} HDR frames merged, {fusion.dropped_cycles} cycles dropped')
@@ -0,0 +1,118 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+import collections
+import threading
+import time
+
+from log_queue import log_event
+from stage_timing import LatencyHistogram
+
+# Latch nodes (command, value) of the device clock, with and without PTP
+DEVICE_CLOCK_LATCH = ('TimestampLatch', 'TimestampLatchValue')
+PTP_CLOCK_LATCH = ('PtpDataSetLatch', 'PtpDataSetLatchValue')
+
+
+class ClockOffsetEstimator(threading.Thread):
+    """
+    Online estimate of the offset between the device clock (PTP time when
+    PtpEnable is on) and the host's time.monotonic_ns. Every interval_s the
+    device clock is latched between two host reads; as in NTP the sample
+    with the shortest round trip of the last window samples is trusted,
+    its offset is accurate to half that round trip. Latching runs on this
+    thread so the acquisition loop never waits on the control channel.
+    The nodemap is looked up on every sample; when it changed (a
+    ManagedDevice was reconnected, the camera clock restarted) the window
+    is cleared and the clock source detected again.
+    """
+
+    def __init__(self, device, interval_s=1.0, window=16):
+        super().__init__(daemon=True)
+        self.device = device
+        self.nodemap = None
+        self.interval_s = interval_s
+        self.samples = collections.deque(maxlen=window)
+        self.offset_ns = 0
+        self.uncertainty_ns = 0
+        self._stop_event = threading.Event()
+        self.sample()
+
+    def _reset(self, nodemap):
+        self.nodemap = nodemap
+        self.samples.clear()
+        try:
+            use_ptp = nodemap['PtpEnable'].value
+        except KeyError:
+            use_ptp = False
+        self.latch_node, self.value_node = PTP_CLOCK_LATCH if use_ptp else DEVICE_CLOCK_LATCH
+
+    def sample(self):
+        nodemap = self.device.nodemap
+        if nodemap is not self.nodemap:
+            self._reset(nodemap)
+        before_ns = time.monotonic_ns()
+        nodemap[self.latch_node].execute()
+        device_ns = nodemap[self.value_node].value
+        after_ns = time.monotonic_ns()
+        round_trip_ns = after_ns - before_ns
+        self.samples.append((round_trip_ns, (before_ns + after_ns) // 2 - device_ns))
+        round_trip_ns, offset_ns = min(self.samples)
+        self.offset_ns = offset_ns
+        self.uncertainty_ns = round_trip_ns // 2
+
+    def to_host_ns(self, device_ns):
+        return device_ns + self.offset_ns
+
+    def run(self):
+        while not self._stop_event.wait(self.interval_s):
+            try:
+                self.sample()
+            except Exception as exception:
+                log_event('clock_offset_failed', str(exception), level='WARNING')
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class EndToEndLatency:
+    """
+    Age of frames at each pipeline stage ('display', 'save', ...), from the
+    device timestamp of the frame (start of exposure) to the host time the
+    stage completed. record() is called from the acquisition thread and
+    from save job callbacks, the histograms are shared under a lock.
+    """
+
+    def __init__(self, estimator):
+        self.estimator = estimator
+        self.histograms = collections.defaultdict(LatencyHistogram)
+        self.last_ns = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, device_timestamp_ns):
+        latency_ns = time.monotonic_ns() - self.estimator.to_host_ns(device_timestamp_ns)
+        # clamp at zero, the offset is only known to within its uncertainty
+        latency_ns = max(latency_ns, 0)
+        with self._lock:
+            self.histograms[stage].record(latency_ns)
+            self.last_ns[stage] = latency_ns
+        return latency_ns
+
+    def get_last_ms(self, stage):
+        latency_ns = self.last_ns.get(stage)
+        return None if latency_ns is None else latency_ns / 1e6
+
+    def summary_ms(self):
+        with self._lock:
+            return {stage: {'count': histogram.total_count,
+                            'p50_ms': histogram.get_percentile(50) / 1e6,
+                            'p99_ms': histogram.get_percentile(99) / 1e6,
+                            'max_ms': histogram.max_ns / 1e6}
+                    for stage, histogram in self.histograms.items()}
+
+    def format_summary(self):
+        lines = [f'End to end latency (clock offset +/- {self.estimator.uncertainty_ns / 1e6:.3f} ms):']
+        for stage, stats in self.summary_ms().items():
+            lines.append(f'''  {stage:<8} n={stats['count']:<8} p50={stats['p50_ms']:8.2f}ms '''
+                         f'''p99={stats['p99_ms']:8.2f}ms max={stats['max_ms']:8.2f}ms''')
+        return '\n'.join(lines)
@@ -0,0 +1,186 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import Future, wait
+
+from arena_api.system import system
+
+# get_buffer timeout, the longest an acquisition thread takes to see shutdown
+BUFFER_TIMEOUT_MS = 500
+# Time allowed for acquisition threads and save jobs to finish on shutdown
+SHUTDOWN_TIMEOUT_S = 10.0
+
+
+class SaveWorkers:
+    """
+    Save job threads. Unlike ThreadPoolExecutor workers, which the
+    interpreter joins at exit, these are daemon threads, so a save that
+    hangs cannot keep the process alive once shutdown gave up on it.
+    """
+
+    def __init__(self, count):
+        self.jobs = queue.Queue()
+        self.threads = [threading.Thread(target=self._run, daemon=True, name=f'save-{index}')
+                        for index in range(count)]
+        self._lock = threading.Lock()
+        self._closed = False
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, function, *args, **kwargs):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('cannot schedule new save jobs after shutdown')
+            future = Future()
+            self.jobs.put((future, function, args, kwargs))
+        return future
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            future, function, args, kwargs = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = function(*args, **kwargs)
+            except BaseException as exception:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            self._closed = True
+        for _ in self.threads:
+            self.jobs.put(None)
+        if wait:
+            for thread in self.threads:
+                thread.join()
+
+
+class AcquisitionLifecycle:
+    """
+    Coordinated start and shutdown of the acquisition threads, save jobs
+    and devices. Acquisition threads fetch buffers with get_buffer(), which
+    waits at most timeout_ms at a time and returns None once shutdown was
+    requested. shutdown() then runs in order:
+      1. set the shutdown event (also done by SIGINT/SIGTERM)
+      2. join the acquisition threads, which stop their own streams
+      3. wait for the queued save jobs; those not done by the deadline are
+         left running and the ones not started yet are cancelled
+      4. stop the streams of threads that did not finish, destroy the devices
+    """
+
+    def __init__(self, save_workers=2, timeout_ms=BUFFER_TIMEOUT_MS, log=print):
+        self.shutdown_event = threading.Event()
+        self.timeout_ms = timeout_ms
+        self.log = log
+        self.devices = []
+        self.threads = []
+        self._save_workers = SaveWorkers(save_workers)
+        self._save_jobs = set()
+        self._lock = threading.Lock()
+        self._finished = False
+
+    def is_running(self):
+        return not self.shutdown_event.is_set()
+
+    def request_shutdown(self, *args):
+        self.shutdown_event.set()
+
+    def install_signal_handlers(self):
+        """
+        Turns Ctrl+C and SIGTERM into a shutdown request. Main thread only.
+        """
+        for signal_name in ['SIGINT', 'SIGTERM']:
+            signal_number = getattr(signal, signal_name, None)
+            if signal_number is not None:
+                signal.signal(signal_number, self.request_shutdown)
+
+    def add_device(self, device):
+        self.devices.append(device)
+        return device
+
+    def start_thread(self, target, *args, name=None, **kwargs):
+        thread = threading.Thread(target=target, args=args, kwargs=kwargs, name=name)
+        self.threads.append(thread)
+        thread.start()
+        return thread
+
+    def get_buffer(self, device):
+        """
+        Returns the next buffer, or None once shutdown was requested or the
+        device is gone for good (a ManagedDevice whose reconnect gave up).
+        A reconnecting ManagedDevice times out like a silent camera.
+        """
+        while not self.shutdown_event.is_set():
+            try:
+                return device.get_buffer(timeout=self.timeout_ms)
+            except TimeoutError:
+                continue
+            except ConnectionError as error:
+                self.log(f'Acquisition stopped: {error}')
+                return None
+        return None
+
+    def submit_save(self, function, *args, **kwargs):
+        """
+        Runs a save job on the save workers. The arguments must not refer to
+        buffers that are requeued before the job runs. Returns None when the
+        job is rejected because shutdown already finished; the caller still
+        owns the arguments then (release pooled frames).
+        """
+        try:
+            future = self._save_workers.submit(function, *args, **kwargs)
+        except RuntimeError:
+            self.log('Save job rejected, shutdown already finished')
+            return None
+        with self._lock:
+            self._save_jobs.add(future)
+        future.add_done_callback(self._save_done)
+        return future
+
+    def _save_done(self, future):
+        with self._lock:
+            self._save_jobs.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            self.log(f'Save job failed: {future.exception()}')
+
+    def shutdown(self, timeout_s=SHUTDOWN_TIMEOUT_S, destroy_devices=True):
+        if self._finished:
+            return
+        self._finished = True
+        self.shutdown_event.set()
+        deadline = time.monotonic() + timeout_s
+        for thread in self.threads:
+            if thread is not threading.current_thread():
+                thread.join(max(0.0, deadline - time.monotonic()))
+        stuck = [thread.name for thread in self.threads if thread.is_alive()]
+        if stuck:
+            self.log(f'Threads still running after {timeout_s} s: {", ".join(stuck)}')
+        with self._lock:
+            save_jobs = list(self._save_jobs)
+        if save_jobs:
+            self.log(f'Waiting for {len(save_jobs)} save job(s)')
+        _, pending = wait(save_jobs, max(0.0, deadline - time.monotonic()))
+        if pending:
+            # bounded exit: a hung save must not keep the process alive
+            cancelled = sum(future.cancel() for future in pending)
+            self.log(f'{len(pending) - cancelled} save job(s) still running after {timeout_s} s, '
+                     f'{cancelled} cancelled')
+        self._save_workers.shutdown(wait=not pending)
+        if stuck:
+            # the threads did not get to stop their streams
+            for device in self.devices:
+                try:
+                    device.stop_stream()
+                except Exception as exception:
+                    self.log(f'Stopping the stream failed: {exception}')
+        if destroy_devices:
+            system.destroy_device()
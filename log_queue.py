@@ -0,0 +1,183 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+import atexit
+import datetime
+import json
+import queue
+import sys
+import threading
+import time
+
+# Records of one (device, event, message) let through per interval
+RATE_LIMIT = 5
+RATE_INTERVAL_S = 1.0
+# Distinct messages tracked before expired ones are forgotten
+MAX_RATE_WINDOWS = 1024
+
+
+class LogRecord:
+    """
+    One structured log entry; formatting happens on the writer thread.
+    """
+    __slots__ = ('time_ns', 'level', 'device', 'frame_id', 'event', 'message', 'fields')
+
+    def __init__(self, event, message='', device=None, frame_id=None, level='INFO', fields=None):
+        self.time_ns = time.time_ns()
+        self.level = level
+        self.device = device
+        self.frame_id = frame_id
+        self.event = event
+        self.message = message
+        self.fields = fields
+
+    def format(self):
+        timestamp = datetime.datetime.fromtimestamp(self.time_ns / 1e9).strftime('%H:%M:%S.%f')[:-3]
+        parts = [timestamp, self.level]
+        if self.device is not None:
+            parts.append(f'[{self.device}]')
+        if self.frame_id is not None:
+            parts.append(f'frame {self.frame_id}')
+        parts.append(f'{self.event}:')
+        if self.message:
+            parts.append(str(self.message))
+        if self.fields:
+            parts.extend(f'{key}={value}' for key, value in self.fields.items())
+        return ' '.join(parts)
+
+    def as_dict(self):
+        record = {'time_ns': self.time_ns, 'level': self.level, 'device': self.device,
+                  'frame_id': self.frame_id, 'event': self.event, 'message': str(self.message)}
+        if self.fields:
+            record.update({key: value if isinstance(value, (int, float, str, bool)) else str(value)
+                           for key, value in self.fields.items()})
+        return record
+
+
+class QueueLogger(threading.Thread):
+    """
+    Logging for the acquisition threads: log() only builds a record and
+    puts it into a bounded queue, one writer thread does the console (and
+    optional JSON lines file) output. A full queue drops the record instead
+    of blocking the frame loop. Repeats of the same (device, event,
+    message) beyond rate_limit per rate_interval_s are counted and reported
+    as one line when the interval is over.
+    The logger is also callable like print, to be passed as log= callback.
+    Setting muted drops every record, e.g. while a benchmark times code
+    that logs.
+    """
+
+    def __init__(self, max_queue_size=4096, rate_limit=RATE_LIMIT, rate_interval_s=RATE_INTERVAL_S,
+                 stream=None, jsonl_path=None):
+        super().__init__(daemon=True, name='log-writer')
+        self.records = queue.Queue(maxsize=max_queue_size)
+        self.rate_limit = rate_limit
+        self.rate_interval_s = rate_interval_s
+        self.stream = stream
+        self.jsonl_path = jsonl_path
+        self.dropped_count = 0
+        self.muted = False
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def _allow(self, key):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._windows) > MAX_RATE_WINDOWS:
+                # forget expired windows of messages that were never repeated
+                self._windows = {key: window for key, window in self._windows.items()
+                                 if window[2] or now - window[0] < self.rate_interval_s}
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.rate_interval_s:
+                suppressed = window[2] if window is not None else 0
+                self._windows[key] = [now, 1, 0]
+                return True, suppressed
+            if window[1] < self.rate_limit:
+                window[1] += 1
+                return True, 0
+            window[2] += 1
+            return False, 0
+
+    def _put(self, record):
+        try:
+            self.records.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped_count += 1
+            return False
+
+    def log(self, event, message='', device=None, frame_id=None, level='INFO', **fields):
+        """
+        Enqueues a record without blocking. Returns False when it was rate
+        limited, muted or the queue was full.
+        """
+        if self.muted:
+            return False
+        allowed, suppressed = self._allow((device, event, message))
+        if suppressed:
+            self._put(LogRecord(event, f'{message} (repeated {suppressed} more times)', device,
+                                level=level))
+        if not allowed:
+            return False
+        return self._put(LogRecord(event, message, device, frame_id, level, fields or None))
+
+    def __call__(self, *args, **kwargs):
+        return self.log('message', ' '.join(str(arg) for arg in args))
+
+    def _flush_suppressed(self):
+        with self._lock:
+            windows, self._windows = self._windows, {}
+        for (device, event, message), window in windows.items():
+            if window[2]:
+                self._put(LogRecord(event, f'{message} (repeated {window[2]} more times)', device))
+
+    def run(self):
+        stream = self.stream or sys.stdout
+        jsonl_file = open(self.jsonl_path, 'a') if self.jsonl_path else None
+        try:
+            while True:
+                record = self.records.get()
+                if record is None:
+                    break
+                stream.write(record.format() + '\n')
+                if jsonl_file is not None:
+                    jsonl_file.write(json.dumps(record.as_dict()) + '\n')
+                if self.records.empty():
+                    stream.flush()
+        finally:
+            if self.dropped_count:
+                stream.write(f'log queue full, {self.dropped_count} records dropped\n')
+            stream.flush()
+            if jsonl_file is not None:
+                jsonl_file.close()
+
+    def stop(self):
+        if not self.is_alive():
+            return
+        self._flush_suppressed()
+        self.records.put(None)
+        self.join()
+
+
+_logger = None
+_logger_lock = threading.Lock()
+
+
+def get_logger():
+    """
+    Returns the process wide logger, started on first use and drained at
+    exit.
+    """
+    global _logger
+    if _logger is not None:
+        return _logger
+    with _logger_lock:
+        if _logger is None:
+            _logger = QueueLogger()
+            _logger.start()
+            atexit.register(_logger.stop)
+    return _logger
+
+
+def log_event(event, message='', device=None, frame_id=None, level='INFO', **fields):
+    return get_logger().log(event, message, device, frame_id, level, **fields)
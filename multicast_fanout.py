@@ -0,0 +1,203 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+from arena_api.system import system
+
+from device_manager import wait_for_device_infos
+
+# Buffer count and buffer handling of every consumer role. The live view
+# only ever wants the newest frame, the recorder must not lose any.
+CONSUMER_PROFILES = {
+    'recorder': {'buffer_count': 50, 'handling_mode': 'OldestFirst'},
+    'viewer': {'buffer_count': 3, 'handling_mode': 'NewestOnly'},
+    'analytics': {'buffer_count': 10, 'handling_mode': 'NewestOnly'},
+}
+READY_LINE = 'MULTICAST CONTROLLER READY'
+TIMEOUT_MILLISEC = 2000
+
+
+def open_device(serial, timeout_s=60):
+    device_infos = wait_for_device_infos([serial], timeout_s)
+    device = system.create_device(device_infos=device_infos)[0]
+    # multicast must be enabled on the controller and on every listener
+    device.tl_stream_nodemap['StreamMulticastEnable'].value = True
+    return device
+
+
+def run_controller(serial, configure=None, buffer_count=3):
+    """
+    Opens the camera ReadWrite, configures it and keeps it streaming to
+    the multicast group until interrupted. It consumes the stream with
+    NewestOnly so that it never slows the camera down.
+    """
+    device = open_device(serial)
+    if device.tl_device_nodemap['DeviceAccessStatus'].value != 'ReadWrite':
+        raise Exception(f'Device {serial} is already controlled by another process')
+    if configure is not None:
+        configure(device)
+    device.nodemap['AcquisitionMode'].value = 'Continuous'
+    device.tl_stream_nodemap['StreamBufferHandlingMode'].value = 'NewestOnly'
+    with device.start_stream(buffer_count):
+        print(READY_LINE, flush=True)
+        try:
+            while True:
+                try:
+                    buffer = device.get_buffer(timeout=TIMEOUT_MILLISEC)
+                except TimeoutError:
+                    continue
+                device.requeue_buffer(buffer)
+        except KeyboardInterrupt:
+            pass
+    system.destroy_device()
+
+
+class ConsumerStats:
+    """
+    Drop statistics of one read-only consumer, from frame id gaps,
+    incomplete buffers and timeouts.
+    """
+
+    def __init__(self, role):
+        self.role = role
+        self.received = 0
+        self.incomplete = 0
+        self.skipped = 0
+        self.timeouts = 0
+        self._last_frame_id = None
+        self._start_time = time.monotonic()
+
+    def add(self, buffer):
+        self.received += 1
+        if buffer.is_incomplete:
+            self.incomplete += 1
+        if self._last_frame_id is not None and buffer.frame_id > self._last_frame_id + 1:
+            # frames the camera sent but this consumer never saw
+            self.skipped += buffer.frame_id - self._last_frame_id - 1
+        self._last_frame_id = buffer.frame_id
+
+    def __str__(self):
+        elapsed = time.monotonic() - self._start_time
+        return (f'[{self.role} pid {os.getpid()}] {self.received} frames '
+                f'({self.received / elapsed:.1f} fps), {self.skipped} skipped, '
+                f'{self.incomplete} incomplete, {self.timeouts} timeouts')
+
+
+def record_frame(image, frame_id, output_dir='multicast_recording'):
+    os.makedirs(output_dir, exist_ok=True)
+    np.save(os.path.join(output_dir, f'frame_{frame_id:08d}.npy'), image)
+
+
+def show_frame(image, frame_id):
+    import cv2
+
+    from utils import get_cat_image
+
+    cv2.imshow('Multicast viewer', cv2.resize(get_cat_image(image), (612, 512)))
+    cv2.waitKey(1)
+
+
+def analyze_frame(image, frame_id):
+    if frame_id % 100 == 0:
+        print(f'frame {frame_id}: mean per channel {image.reshape(-1, image.shape[-1]).mean(axis=0)}')
+
+
+CONSUMER_PROCESSES = {
+    'recorder': record_frame,
+    'viewer': show_frame,
+    'analytics': analyze_frame,
+}
+
+
+def run_consumer(serial, role, buffer_count=None, report_interval_s=5.0):
+    """
+    Receives the multicast stream read-only with the role's own buffer
+    count and handling mode, so a slow consumer only drops its own frames.
+    """
+    profile = CONSUMER_PROFILES[role]
+    process = CONSUMER_PROCESSES[role]
+    device = open_device(serial)
+    device.tl_stream_nodemap['StreamBufferHandlingMode'].value = profile['handling_mode']
+    stats = ConsumerStats(role)
+    last_report = time.monotonic()
+    with device.start_stream(buffer_count or profile['buffer_count']):
+        try:
+            while True:
+                try:
+                    buffer = device.get_buffer(timeout=TIMEOUT_MILLISEC)
+                except TimeoutError:
+                    stats.timeouts += 1
+                    continue
+                stats.add(buffer)
+                if not buffer.is_incomplete:
+                    bytes_per_pixel = int(buffer.bits_per_pixel / 8)
+                    image = np.ctypeslib.as_array(
+                        buffer.pdata, (buffer.height, buffer.width, bytes_per_pixel))
+                    process(image, buffer.frame_id)
+                device.requeue_buffer(buffer)
+                if time.monotonic() - last_report >= report_interval_s:
+                    print(stats, flush=True)
+                    last_report = time.monotonic()
+        except KeyboardInterrupt:
+            pass
+    print(stats, flush=True)
+    system.destroy_device()
+
+
+def forward_output(stream):
+    # a pipe nobody reads fills up and blocks the writing process
+    for line in stream:
+        sys.stdout.write(line)
+    stream.close()
+
+
+def launch_fanout(serial, roles):
+    """
+    Starts the controller, waits until it streams, then starts one
+    read-only process per consumer role. Returns the processes.
+    """
+    script = os.path.abspath(__file__)
+    controller = subprocess.Popen([sys.executable, script, 'controller', serial],
+                                  stdout=subprocess.PIPE, text=True)
+    for line in controller.stdout:
+        sys.stdout.write(line)
+        if line.strip() == READY_LINE:
+            break
+    else:
+        raise Exception('Multicast controller exited before streaming')
+    # keep draining the controller's output for as long as it runs
+    threading.Thread(target=forward_output, args=(controller.stdout,), daemon=True).start()
+    consumers = [subprocess.Popen([sys.executable, script, role, serial]) for role in roles]
+    return [controller] + consumers
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Multicast fan-out of one camera')
+    parser.add_argument('role', choices=['controller', 'fanout'] + list(CONSUMER_PROFILES))
+    parser.add_argument('serial')
+    parser.add_argument('--buffers', type=int, default=None)
+    parser.add_argument('--consumers', nargs='*', default=list(CONSUMER_PROFILES))
+    args = parser.parse_args()
+
+    if args.role == 'controller':
+        from py_acquisition_single_device import configure_some_nodes
+        run_controller(args.serial, configure_some_nodes)
+    elif args.role == 'fanout':
+        processes = launch_fanout(args.serial, args.consumers)
+        try:
+            for process in processes[1:]:
+                process.wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for process in processes:
+                process.terminate()
+    else:
+        run_consumer(args.serial, args.role, args.buffers)
@@ -0,0 +1,78 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+# Special values resolved against the node range at write time
+MAX = 'max'
+MIN = 'min'
+
+# Node configuration of the polarization acquisition scripts, as
+# (nodemap, node name, value) in dependency order: pixel format before the
+# geometry, geometry before the frame rate whose maximum depends on both.
+POLARIZED_NODE_CONFIG = [
+    ('tl_stream_nodemap', 'StreamAutoNegotiatePacketSize', True),
+    ('tl_stream_nodemap', 'StreamPacketResendEnable', True),
+    ('nodemap', 'PixelFormat', 'PolarizedAngles_0d_45d_90d_135d_BayerRG8'),
+    ('nodemap', 'Width', MAX),
+    ('nodemap', 'Height', MAX),
+    ('nodemap', 'AcquisitionMode', 'Continuous'),
+    ('nodemap', 'BalanceWhiteEnable', True),
+    ('nodemap', 'BalanceWhiteAuto', 'Continuous'),
+    ('nodemap', 'ExposureAuto', 'Continuous'),
+    ('nodemap', 'GainAuto', 'Off'),
+    ('nodemap', 'AcquisitionFrameRateEnable', True),
+    ('nodemap', 'AcquisitionFrameRate', MAX),
+    ('nodemap', 'DeviceStreamChannelPacketSize', MAX),
+]
+
+
+def take_snapshot(device, node_config):
+    """
+    Reads the current value of every configured node, one lookup per
+    nodemap. Returns {(nodemap name, node name): value}.
+    """
+    snapshot = {}
+    node_names = {}
+    for nodemap_name, node_name, _ in node_config:
+        node_names.setdefault(nodemap_name, []).append(node_name)
+    for nodemap_name, names in node_names.items():
+        nodes = getattr(device, nodemap_name).get_node(names)
+        for node_name, node in nodes.items():
+            snapshot[(nodemap_name, node_name)] = node.value
+    return snapshot
+
+
+def is_equal(current, target):
+    if isinstance(target, float) or isinstance(current, float):
+        return abs(current - target) <= 1e-6 * max(1.0, abs(target))
+    return current == target
+
+
+def apply_node_config(device, node_config, snapshot=None):
+    """
+    Writes only the nodes whose value differs from the snapshot, in the
+    order of node_config. MAX/MIN nodes are resolved after the nodes they
+    depend on have been written, and read again if anything was written
+    before them because their range may have moved. A CachedDevice drops
+    the written nodes and their dependents from its cache.
+    Returns the list of written (nodemap name, node name, value).
+    """
+    if snapshot is None:
+        snapshot = take_snapshot(device, node_config)
+    invalidate = getattr(device, 'invalidate', None)
+    written = []
+    for nodemap_name, node_name, target in node_config:
+        node = getattr(device, nodemap_name)[node_name]
+        current = snapshot[(nodemap_name, node_name)]
+        if target in (MAX, MIN):
+            target = node.max if target == MAX else node.min
+            if written:
+                current = node.value
+        if is_equal(current, target):
+            continue
+        node.value = target
+        if invalidate is not None and nodemap_name == 'nodemap':
+            invalidate(node_name)
+        snapshot[(nodemap_name, node_name)] = target
+        written.append((nodemap_name, node_name, target))
+    return written
+
@@ -0,0 +1,310 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+import queue
+import struct
+import threading
+import time
+
+import numpy as np
+
+# channels per pixel of the supported 3D pixel formats, each channel is 16 bits
+COORD3D_CHANNELS = {
+    'Coord3D_ABCY16': 4,
+    'Coord3D_ABCY16s': 4,
+    'Coord3D_ABC16': 3,
+    'Coord3D_ABC16s': 3,
+}
+# invalid points are reported with this z value by the camera
+UNSIGNED_16BIT_MAX = 65535
+SIGNED_16BIT_MIN = -32768
+# points beyond this distance are black in the distance heatmap
+HEATMAP_MAX_DISTANCE_MM = 1500
+
+# header written in front of every frame of a point cloud log:
+#   magic, frame index, timestamp (ns), number of points, has intensity
+POINT_LOG_MAGIC = b'PCLG'
+POINT_LOG_HEADER = struct.Struct('<4sIqIB')
+
+
+def get_coordinate_scales(nodemap):
+    """
+    Reads Scan3dCoordinateScale/Offset for coordinates A, B and C.
+    The selector is restored to its initial value afterwards.
+    """
+    selector_node = nodemap['Scan3dCoordinateSelector']
+    selector_initial = selector_node.value
+    scale = np.zeros(3, dtype=np.float32)
+    offset = np.zeros(3, dtype=np.float32)
+    for index, coordinate in enumerate(['CoordinateA', 'CoordinateB', 'CoordinateC']):
+        selector_node.value = coordinate
+        scale[index] = nodemap['Scan3dCoordinateScale'].value
+        offset[index] = nodemap['Scan3dCoordinateOffset'].value
+    selector_node.value = selector_initial
+    return scale, offset
+
+
+def get_coord3d_array(buffer, pixel_format):
+    """
+    Views the buffer data as an (N, channels) 16 bit array without copying.
+    The view is only valid until the buffer is requeued.
+    """
+    channels = COORD3D_CHANNELS[pixel_format]
+    dtype = np.int16 if pixel_format.endswith('s') else np.uint16
+    number_of_bytes = buffer.width * buffer.height * channels * 2
+    raw = np.ctypeslib.as_array(buffer.pdata, (number_of_bytes,))
+    return raw.view(dtype).reshape(-1, channels)
+
+
+def get_valid_mask(coord3d_array):
+    """
+    Returns a boolean mask of the points that carry a valid z value.
+    """
+    z = coord3d_array[:, 2]
+    if coord3d_array.dtype == np.int16:
+        return z != SIGNED_16BIT_MIN
+    return z != UNSIGNED_16BIT_MAX
+
+
+def decode_coord3d(coord3d_array, scale, offset, filter_points=False, out=None):
+    """
+    Converts an (N, channels) Coord3D array into float32 xyz in millimeters.
+    Intensity is returned as a view of the Y channel, or None for ABC16.
+    Unsigned formats are shifted by the coordinate offsets, signed formats
+    are not, as in examples/py_helios_min_and_max_depth.py.
+    """
+    if filter_points:
+        coord3d_array = coord3d_array[get_valid_mask(coord3d_array)]
+    number_of_points = coord3d_array.shape[0]
+    if out is None or out.shape[0] < number_of_points:
+        out = np.empty((number_of_points, 3), dtype=np.float32)
+    xyz = out[:number_of_points]
+    np.multiply(coord3d_array[:, :3], scale, out=xyz, casting='unsafe')
+    if coord3d_array.dtype == np.uint16:
+        np.add(xyz, offset, out=xyz)
+    intensity = coord3d_array[:, 3] if coord3d_array.shape[1] == 4 else None
+    return xyz, intensity
+
+
+def find_min_max_z(xyz, coord3d_array):
+    """
+    Returns the indexes of the closest point in front of the camera (z > 0)
+    and of the farthest point, or None when no point is in front. xyz is
+    the unfiltered decode of coord3d_array, whose invalid points are left
+    out, as the z < UNSIGNED_16BIT_MAX test of
+    examples/py_helios_min_and_max_depth.py does.
+    """
+    z = xyz[:, 2]
+    valid = get_valid_mask(coord3d_array)
+    in_front = valid & (z > 0)
+    if not in_front.any():
+        return None
+    min_index = int(np.argmin(np.where(in_front, z, np.inf)))
+    max_index = int(np.argmax(np.where(valid, z, -np.inf)))
+    return min_index, max_index
+
+
+def get_heatmap_lut(max_distance_mm=HEATMAP_MAX_DISTANCE_MM):
+    """
+    BGR color of every whole millimeter from 0 to max_distance_mm, red to
+    yellow, green, cyan and blue as in examples/py_helios_heatmap.py. The
+    last entry is black, for points out of range.
+    """
+    borders = np.linspace(0, max_distance_mm, 5)
+    distances = np.arange(max_distance_mm + 1, dtype=np.float32)
+    red = np.interp(distances, borders, [255, 255, 0, 0, 0])
+    green = np.interp(distances, borders, [0, 255, 255, 255, 0])
+    blue = np.interp(distances, borders, [0, 0, 0, 255, 255])
+    lut = np.zeros((max_distance_mm + 2, 3), dtype=np.uint8)
+    lut[:-1] = np.stack([blue, green, red], axis=1).astype(np.uint8)
+    return lut
+
+
+def get_distance_heatmap(z_mm, lut=None, out=None):
+    """
+    Colors z (mm) with a heatmap lookup table, one table lookup per point
+    instead of the per pixel Python loop of the example.
+    """
+    if lut is None:
+        lut = get_heatmap_lut()
+    out_of_range = len(lut) - 1
+    index = z_mm.astype(np.int32)
+    index[(index < 0) | (index >= out_of_range)] = out_of_range
+    if out is None:
+        out = np.empty(index.shape + (3,), dtype=np.uint8)
+    np.take(lut, index, axis=0, out=out)
+    return out
+
+
+class Coord3dDecoder:
+    """
+    Decodes Coord3D buffers of one device into point clouds.
+    Scale and offset are queried once and cached; call invalidate() after
+    changing nodes that affect them (e.g. Scan3dOperatingMode).
+    """
+
+    def __init__(self, device, filter_points=True):
+        self.device = device
+        self.filter_points = filter_points
+        self._scale = None
+        self._offset = None
+
+    def invalidate(self):
+        self._scale = None
+        self._offset = None
+
+    def get_scales(self):
+        if self._scale is None:
+            get_coordinate = getattr(self.device, 'get_coordinate', None)
+            if get_coordinate is None:
+                self._scale, self._offset = get_coordinate_scales(self.device.nodemap)
+            else:
+                # device_wrapper.CachedDevice shares its coordinate cache
+                coordinates = [get_coordinate(coordinate) for coordinate
+                               in ['CoordinateA', 'CoordinateB', 'CoordinateC']]
+                self._scale = np.array([scale for scale, _ in coordinates], dtype=np.float32)
+                self._offset = np.array([offset for _, offset in coordinates], dtype=np.float32)
+        return self._scale, self._offset
+
+    def decode(self, buffer):
+        """
+        Returns xyz (N, 3) float32 and intensity (N,) uint16 or None.
+        The outputs own their memory so the buffer can be requeued at once.
+        """
+        scale, offset = self.get_scales()
+        coord3d_array = get_coord3d_array(buffer, buffer.pixel_format.name)
+        xyz, intensity = decode_coord3d(coord3d_array, scale, offset,
+                                        filter_points=self.filter_points)
+        if intensity is not None:
+            intensity = intensity.astype(np.uint16)
+        return xyz, intensity
+
+
+def write_binary_ply(file, xyz, intensity=None):
+    """
+    Writes a binary little endian PLY file with float32 xyz and an optional
+    ushort intensity property.
+    """
+    header = ['ply', 'format binary_little_endian 1.0',
+              f'element vertex {xyz.shape[0]}',
+              'property float x', 'property float y', 'property float z']
+    if intensity is not None:
+        header.append('property ushort intensity')
+    header.append('end_header')
+    file.write(('\n'.join(header) + '\n').encode('ascii'))
+    if intensity is None:
+        file.write(np.ascontiguousarray(xyz, dtype='<f4').tobytes())
+        return
+    vertex = np.empty(xyz.shape[0], dtype=[('xyz', '<f4', 3), ('intensity', '<u2')])
+    vertex['xyz'] = xyz
+    vertex['intensity'] = intensity
+    file.write(vertex.tobytes())
+
+
+def read_point_log(path):
+    """
+    Generator over (frame_index, timestamp_ns, xyz, intensity) records of a
+    point cloud log written by PointCloudWriter.
+    """
+    with open(path, 'rb') as file:
+        while True:
+            header = file.read(POINT_LOG_HEADER.size)
+            if len(header) < POINT_LOG_HEADER.size:
+                return
+            magic, frame_index, timestamp_ns, number_of_points, has_intensity = \
+                POINT_LOG_HEADER.unpack(header)
+            if magic != POINT_LOG_MAGIC:
+                raise ValueError(f'Corrupted point cloud log {path}')
+            xyz = np.frombuffer(file.read(number_of_points * 12), dtype='<f4').reshape(-1, 3)
+            intensity = None
+            if has_intensity:
+                intensity = np.frombuffer(file.read(number_of_points * 2), dtype='<u2')
+            yield frame_index, timestamp_ns, xyz, intensity
+
+
+class PointCloudWriter(threading.Thread):
+    """
+    Background writer for consecutive point cloud frames.
+    With mode 'log' every frame is appended to a single binary log file,
+    with mode 'ply' every frame goes to its own binary PLY file named after
+    pattern (formatted with the frame index).
+    """
+
+    def __init__(self, pattern, mode='log', max_queue_size=16):
+        super().__init__(daemon=True)
+        if mode not in ('log', 'ply'):
+            raise ValueError(f'Unknown point cloud writer mode {mode}')
+        self.pattern = pattern
+        self.mode = mode
+        self.frames = queue.Queue(maxsize=max_queue_size)
+        self.frame_count = 0
+        self.dropped_count = 0
+        self.saved_files = []
+
+    def put(self, xyz, intensity=None, timestamp_ns=None, block=False):
+        """
+        Queues a frame for writing. Without block the frame is dropped when
+        the writer falls behind so acquisition never waits on the disk.
+        """
+        if timestamp_ns is None:
+            timestamp_ns = time.time_ns()
+        try:
+            self.frames.put((self.frame_count, timestamp_ns, xyz, intensity), block=block)
+        except queue.Full:
+            self.dropped_count += 1
+            return False
+        self.frame_count += 1
+        return True
+
+    def stop(self):
+        """
+        Writes the queued frames and waits for the writer to finish.
+        """
+        self.frames.put(None)
+        self.join()
+
+    def run(self):
+        log_file = open(self.pattern, 'ab') if self.mode == 'log' else None
+        try:
+            while True:
+                frame = self.frames.get()
+                if frame is None:
+                    break
+                frame_index, timestamp_ns, xyz, intensity = frame
+                if log_file is not None:
+                    self._append_to_log(log_file, frame_index, timestamp_ns, xyz, intensity)
+                else:
+                    path = self.pattern.format(frame_index)
+                    with open(path, 'wb') as file:
+                        write_binary_ply(file, xyz, intensity)
+                    self.saved_files.append(path)
+        finally:
+            if log_file is not None:
+                log_file.close()
+
+    @staticmethod
+    def _append_to_log(log_file, frame_index, timestamp_ns, xyz, intensity):
+        log_file.write(POINT_LOG_HEADER.pack(POINT_LOG_MAGIC, frame_index, timestamp_ns,
+                                             xyz.shape[0], intensity is not None))
+        log_file.write(np.ascontiguousarray(xyz, dtype='<f4').tobytes())
+        if intensity is not None:
+            log_file.write(np.ascontiguousarray(intensity, dtype='<u2').tobytes())
+
+
+if __name__ == '__main__':
+    from py_acquisition_single_device import create_devices_with_tries
+
+    devices = create_devices_with_tries()
+    device = devices[0]
+    device.nodemap['PixelFormat'].value = 'Coord3D_ABCY16'
+    decoder = Coord3dDecoder(device)
+    writer = PointCloudWriter('point_cloud.pclog')
+    writer.start()
+    with device.start_stream(10):
+        for _ in range(100):
+            buffer = device.get_buffer()
+            xyz, intensity = decoder.decode(buffer)
+            writer.put(xyz, intensity, timestamp_ns=buffer.timestamp_ns)
+            device.requeue_buffer(buffer)
+    writer.stop()
+    print(f'{writer.frame_count} frames written, {writer.dropped_count} dropped')
@@ -0,0 +1,323 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+import numpy as np
+
+from hdr import get_dolp_aolp
+from log_queue import log_event
+
+PREVIEW_FPS = 10
+JPEG_QUALITY = 80
+# Views without a viewer are encoded this long after the last request
+VIEW_IDLE_S = 2.0
+MJPEG_BOUNDARY = 'frame'
+# A burst gives up when no new frame arrives for this long
+BURST_TIMEOUT_S = 5.0
+# Upper bound of POST /burst?count=N, a burst holds pool frames until saved
+MAX_BURST_COUNT = 1000
+
+
+def get_preview_mosaic(buffer_array, width=1224):
+    """
+    The four demosaiced angles of a PolarizedAngles frame in a 2 x 2
+    mosaic, as in get_cat_image, scaled to width pixels.
+    """
+    images = [cv2.cvtColor(buffer_array[:, :, index], cv2.COLOR_BayerRG2RGB) for index in range(4)]
+    mosaic = np.concatenate((np.concatenate(images[:2], axis=1), np.concatenate(images[2:], axis=1)), axis=0)
+    height = mosaic.shape[0] * width // mosaic.shape[1]
+    return cv2.resize(mosaic, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def get_preview_dolp_aolp(buffer_array):
+    # the ratio DoLP does not care that halving mixes the Bayer colors
+    height, width = buffer_array.shape[:2]
+    small = cv2.resize(buffer_array, (width // 2, height // 2), interpolation=cv2.INTER_AREA)
+    return get_dolp_aolp(small.astype(np.float32))
+
+
+def get_dolp_image(buffer_array):
+    dolp, _ = get_preview_dolp_aolp(buffer_array)
+    return cv2.applyColorMap(np.clip(dolp * 255, 0, 255).astype(np.uint8), cv2.COLORMAP_JET)
+
+
+def get_aolp_image(buffer_array):
+    """
+    AoLP as hue, brightness by DoLP so unpolarized areas stay dark.
+    """
+    dolp, aolp = get_preview_dolp_aolp(buffer_array)
+    hsv = np.empty(dolp.shape + (3,), dtype=np.uint8)
+    hsv[:, :, 0] = ((aolp + np.pi / 2) / np.pi * 179).astype(np.uint8)
+    hsv[:, :, 1] = 255
+    hsv[:, :, 2] = np.clip(dolp * 255, 0, 255).astype(np.uint8)
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+
+
+def save_burst(sources, count, save, stop_event, timeout_s=BURST_TIMEOUT_S, poll_s=0.001):
+    """
+    Hands the next count frames of the first source, together with the
+    newest frame of every other source, to save({name: frame}), which
+    takes over the references. The LatestFrames are polled, so a burst
+    never slows the acquisition threads; frames published faster than
+    poll_s are skipped. Returns the number of saved sets.
+    """
+    first = next(iter(sources))
+    saved_count = 0
+    last_frame_id = None
+    deadline = time.monotonic() + timeout_s
+    while saved_count < count and not stop_event.is_set() and time.monotonic() < deadline:
+        frame = sources[first].get()
+        if frame is None or frame.frame_id == last_frame_id:
+            if frame is not None:
+                frame.release()
+            stop_event.wait(poll_s)
+            continue
+        last_frame_id = frame.frame_id
+        frames = {first: frame}
+        for name, latest in sources.items():
+            if name != first:
+                frames[name] = latest.get()
+        save(frames)
+        saved_count += 1
+        deadline = time.monotonic() + timeout_s
+    return saved_count
+
+
+PREVIEW_VIEWS = {
+    'mosaic': get_preview_mosaic,
+    'dolp': get_dolp_image,
+    'aolp': get_aolp_image,
+}
+
+
+class PreviewServer:
+    """
+    Headless live preview over HTTP. sources maps a camera name to the
+    LatestFrame its acquisition thread publishes to. An encoder thread
+    picks up the newest frame of every source at preview_fps and encodes
+    the views somebody is watching on a worker pool; a view whose last
+    encode is still running is skipped, so there is never a backlog.
+    Every viewer gets the same JPEG bytes, so the number of viewers
+    changes neither the encoding nor the acquisition rate.
+
+        GET  /                          index page
+        GET  /stream/<source>/<view>    MJPEG stream
+        GET  /snapshot/<source>/<view>  single JPEG
+        POST /save                      on_save()
+        POST /burst?count=N             on_burst(N)
+    """
+
+    def __init__(self, sources, views=None, host='127.0.0.1', port=8080, preview_fps=PREVIEW_FPS,
+                 quality=JPEG_QUALITY, workers=2, on_save=None, on_burst=None):
+        self.sources = sources
+        self.views = dict(PREVIEW_VIEWS if views is None else views)
+        self.address = (host, port)
+        self.preview_fps = preview_fps
+        self.quality = quality
+        self.on_save = on_save
+        self.on_burst = on_burst
+        self.encoded_count = 0
+        self.skipped_count = 0
+        self._jpegs = {}
+        self._requested = {}
+        self._streams = {}
+        self._busy = set()
+        self._last_frame_ids = {}
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='jpeg')
+        self._stop_event = threading.Event()
+        self._encoder = threading.Thread(target=self._encode_loop, daemon=True, name='preview-encoder')
+        self._server = None
+
+    def start(self):
+        server = self
+
+        class PreviewHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server._handle_get(self)
+
+            def do_POST(self):
+                server._handle_post(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(self.address, PreviewHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True, name='preview-http').start()
+        self._encoder.start()
+
+    def stop(self):
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        self._encoder.join()
+        self._executor.shutdown(wait=True)
+
+    def _encode(self, key, frame):
+        ok = False
+        try:
+            image = self.views[key[1]](frame.array)
+            ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        except Exception as exception:
+            log_event('preview_encode_failed', str(exception), device=key[0], level='ERROR', view=key[1])
+        finally:
+            frame.release()
+        with self._condition:
+            # the view is encoded again on the next tick, also after a failure
+            self._busy.discard(key)
+            if ok:
+                sequence = self._jpegs.get(key, (0, None))[0] + 1
+                self._jpegs[key] = (sequence, encoded.tobytes())
+                self.encoded_count += 1
+                self._condition.notify_all()
+
+    def _encode_loop(self):
+        interval_s = 1.0 / self.preview_fps
+        next_time = time.monotonic()
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            with self._condition:
+                wanted = [key for key, last_request in self._requested.items()
+                          if last_request is None or now - last_request < VIEW_IDLE_S]
+            for source_name in {key[0] for key in wanted}:
+                frame = self.sources[source_name].get()
+                if frame is None:
+                    continue
+                if self._last_frame_ids.get(source_name) == frame.frame_id:
+                    frame.release()
+                    continue
+                self._last_frame_ids[source_name] = frame.frame_id
+                for key in wanted:
+                    if key[0] != source_name:
+                        continue
+                    with self._condition:
+                        if key in self._busy:
+                            self.skipped_count += 1
+                            continue
+                        self._busy.add(key)
+                    self._executor.submit(self._encode, key, frame.retain())
+                frame.release()
+            next_time = max(next_time + interval_s, time.monotonic())
+            self._stop_event.wait(max(0.0, next_time - time.monotonic()))
+
+    def _watch(self, key, streaming):
+        with self._condition:
+            if streaming:
+                self._streams[key] = self._streams.get(key, 0) + 1
+            # None marks a view with an open stream, it is always encoded
+            self._requested[key] = None if self._streams.get(key) else time.monotonic()
+            return self._jpegs.get(key, (0, None))[0]
+
+    def _unwatch(self, key):
+        with self._condition:
+            self._streams[key] -= 1
+            if not self._streams[key]:
+                self._requested[key] = time.monotonic()
+
+    def wait_jpeg(self, key, last_sequence, timeout_s=1.0):
+        """
+        Returns (sequence, jpeg) newer than last_sequence, or (last_sequence,
+        None) on timeout.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._stop_event.is_set() or
+                                     self._jpegs.get(key, (0, None))[0] > last_sequence, timeout_s)
+            sequence, jpeg = self._jpegs.get(key, (0, None))
+        if sequence > last_sequence:
+            return sequence, jpeg
+        return last_sequence, None
+
+    def _get_key(self, handler, parts):
+        if len(parts) != 3 or parts[1] not in self.sources or parts[2] not in self.views:
+            handler.send_error(404)
+            return None
+        return parts[1], parts[2]
+
+    def _handle_get(self, handler):
+        parts = [part for part in urlparse(handler.path).path.split('/') if part]
+        if not parts:
+            self._send_index(handler)
+        elif parts[0] == 'stream':
+            key = self._get_key(handler, parts)
+            if key is not None:
+                self._send_stream(handler, key)
+        elif parts[0] == 'snapshot':
+            key = self._get_key(handler, parts)
+            if key is not None:
+                # a frame encoded after the request, not the one cached when the view went idle
+                sequence = self._watch(key, streaming=False)
+                _, jpeg = self.wait_jpeg(key, sequence, timeout_s=2.0)
+                if jpeg is None:
+                    handler.send_error(503, 'No frame yet')
+                    return
+                self._send_bytes(handler, jpeg, 'image/jpeg')
+        else:
+            handler.send_error(404)
+
+    def _handle_post(self, handler):
+        url = urlparse(handler.path)
+        if url.path == '/save' and self.on_save is not None:
+            result = self.on_save()
+        elif url.path == '/burst' and self.on_burst is not None:
+            try:
+                count = int(parse_qs(url.query).get('count', ['10'])[0])
+            except ValueError:
+                count = 0
+            if not 0 < count <= MAX_BURST_COUNT:
+                handler.send_error(400, f'count must be 1 to {MAX_BURST_COUNT}')
+                return
+            result = self.on_burst(count)
+        else:
+            handler.send_error(404)
+            return
+        self._send_bytes(handler, json.dumps({'ok': True, 'result': result}).encode(), 'application/json')
+
+    def _send_bytes(self, handler, body, content_type):
+        handler.send_response(200)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(body)))
+        handler.send_header('Cache-Control', 'no-store')
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _send_index(self, handler):
+        images = ''.join(f'<p>{source} {view}<br><img src="/stream/{source}/{view}"></p>'
+                         for source in self.sources for view in self.views)
+        body = (f'<html><body>{images}'
+                f'<form method="post" action="/save"><button>Save</button></form>'
+                f'<form method="post" action="/burst?count=10"><button>Burst 10</button></form>'
+                f'</body></html>').encode()
+        self._send_bytes(handler, body, 'text/html')
+
+    def _send_stream(self, handler, key):
+        handler.send_response(200)
+        handler.send_header('Content-Type', f'multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}')
+        handler.send_header('Cache-Control', 'no-store')
+        handler.end_headers()
+        self._watch(key, streaming=True)
+        sequence = 0
+        try:
+            while not self._stop_event.is_set():
+                sequence, jpeg = self.wait_jpeg(key, sequence)
+                if jpeg is None:
+                    continue
+                handler.wfile.write(f'--{MJPEG_BOUNDARY}\r\nContent-Type: image/jpeg\r\n'
+                                    f'Content-Length: {len(jpeg)}\r\n\r\n'.encode())
+                handler.wfile.write(jpeg)
+                handler.wfile.write(b'\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # viewer went away
+            pass
+        finally:
+            self._unwatch(key)
@@ -1,37 +1,41 @@
 # @Author:ZhangZl
 # @Date:30/11/2021
 
-import threading
-
 import py_acquisition_single_device as SingleDevice
+from lifecycle import AcquisitionLifecycle
+from log_queue import get_logger
+from stream_stats import STREAM_STATS_PORT, StreamStatsCollector
 
 
 def example_entry_point():
 
     # Create devices
-    devices = SingleDevice.create_devices_with_tries()
+    # a camera that drops off the network is reconnected, its thread waits
+    manager, devices = SingleDevice.create_managed_devices()
 
-    # Create an empty list for threads
-    thread_list = []
+    # Ctrl+C stops every camera, saves are finished before the devices go
+    lifecycle = AcquisitionLifecycle(log=get_logger())
+    lifecycle.install_signal_handlers()
+    # lost/incomplete/resent counters at http://127.0.0.1:9110/ (Prometheus text)
+    stats_collector = StreamStatsCollector(devices, port=STREAM_STATS_PORT)
+    stats_collector.start()
 
-    # Create a thread for each device
+    # Create and start a thread for each device
     for device in devices:
-        thread = threading.Thread(target=SingleDevice.get_single_device_buffer,
-                                  args=(device,))
-        # Add a thread to the thread list
-        thread_list.append(thread)
-
-    # Start each thread in the thread list
-    for thread in thread_list:
-        thread.start()
+        lifecycle.add_device(device)
+        lifecycle.start_thread(SingleDevice.get_single_device_buffer, device, lifecycle=lifecycle)
 
     # Join each thread in the thread list
     """
     Calling thread is blocked util the thread object on which it was
     called is terminated.
     """
-    for thread in thread_list:
-        thread.join()
+    for thread in lifecycle.threads:
+        while thread.is_alive():
+            thread.join(0.5)
+    lifecycle.shutdown(destroy_devices=False)
+    stats_collector.stop()
+    manager.close()
 
 
 if __name__ == '__main__':
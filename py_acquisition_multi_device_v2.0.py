@@ -3,220 +3,266 @@
 
 import datetime
 import os
-import threading
+import sys
 import time
 
 import cv2
 import numpy as np
-from arena_api.system import system
 
-isQuit = False
+from bandwidth import BandwidthBudgeter, ThroughputMonitor
+from buffer_tuner import BufferCountTuner
+from chunk_meta import ChunkReader, enable_frame_chunks
+from device_manager import DeviceManager, create_devices_with_backoff
+from frame_pool import FramePool, LatestFrame
+from lifecycle import AcquisitionLifecycle
+from log_queue import get_logger, log_event
+from node_config import POLARIZED_NODE_CONFIG
+from preview_server import PreviewServer, save_burst
+from rig_config import load_rig_config
+from stream_stats import STREAM_STATS_PORT, StreamStatsCollector
+from utils import get_RGB8_image, get_stereo_cat_image, save_stereo_images
+from warm_start import warm_start_configure, warm_start_devices
+
 left_images = []
 right_images = []
+left_metadata = None
+right_metadata = None
+# raw frames, kept in each device's frame pool after the buffer is requeued
+left_raw = LatestFrame()
+right_raw = LatestFrame()
 
 
 def create_devices_with_tries():
-    tries = 0
-    tries_max = 6
-    sleep_time_secs = 10
-    while tries < tries_max:  # Wait for device for 60 seconds
-        devices = system.create_device()
-        if not devices:
-            print(
-                f'Try {tries + 1} of {tries_max}: waiting for {sleep_time_secs} '
-                f'secs for a device to be connected!')
-            for sec_count in range(sleep_time_secs):
-                time.sleep(1)
-                print(f'{sec_count + 1} seconds passed ',
-                      '.' * sec_count, end='\r')
-            tries += 1
-        else:
-            print(f'Created {len(devices)} device(s)')
-            return devices
-    else:
-        raise Exception(f'No device found! Please connect a device and run '
-                        f'the example again.')
+    """
+    This function waits up to 60 seconds for the user to connect a device
+    before raising an exception, polling with a short backoff
+    """
+    return create_devices_with_backoff(timeout_s=60)
 
 
 def configure_some_nodes(device):
-    tl_stream_nodemap = device.tl_stream_nodemap
-    # Enable stream auto negotiate packet size
-    tl_stream_nodemap['StreamAutoNegotiatePacketSize'].value = True
-    # Enable stream packet resend
-    tl_stream_nodemap['StreamPacketResendEnable'].value = True
-    # make sure the device sends images continuously
-
-    nodemap = device.nodemap
-    nodemap['AcquisitionMode'].value = 'Continuous'
-    # white balance
-    nodemap['BalanceWhiteEnable'].value = True
-    nodemap['BalanceWhiteAuto'].value = 'Continuous'
-    # ExposureAuto
-    nodemap['ExposureAuto'].value = 'Continuous'
-    # Gain
-    nodemap['GainAuto'].value = 'Off'
-    # nodemap['Gain'].value = nodemap['Gain'].max
-
-    # automate the calculation of max FPS whenever the device settings change
-    nodemap['AcquisitionFrameRateEnable'].value = True
-    # set FPS node to max FPS which was set to be automatically calculated
-    # base on current device settings
-    nodemap['AcquisitionFrameRate'].value = nodemap['AcquisitionFrameRate'].max
-    # max FPS according to the current settings
-    nodemap['DeviceStreamChannelPacketSize'].value = nodemap['DeviceStreamChannelPacketSize'].max
-
-    # Set features before streaming.-------------------------------------------
-    nodes = device.nodemap.get_node(['Width', 'Height', 'PixelFormat'])
-    # Set width and height to their max values
-    nodes['Width'].value = nodes['Width'].max
-    nodes['Height'].value = nodes['Height'].max
-    nodes['PixelFormat'].value = "PolarizedAngles_0d_45d_90d_135d_BayerRG8"
-    safe_print(f'Node Configure finished successfully!')
-
-
-def get_RGB8_image(buffer_array):
-    image_d0 = cv2.cvtColor(buffer_array[:, :, 0], cv2.COLOR_BayerRG2RGB)
-    image_d45 = cv2.cvtColor(buffer_array[:, :, 1], cv2.COLOR_BayerRG2RGB)
-    image_d90 = cv2.cvtColor(buffer_array[:, :, 2], cv2.COLOR_BayerRG2RGB)
-    image_d135 = cv2.cvtColor(buffer_array[:, :, 3], cv2.COLOR_BayerRG2RGB)
-
-    return [image_d0, image_d45, image_d90, image_d135]
-
-
-def get_cat_image(image_list):
-    image_d0 = image_list[0]
-    # cv2.putText(image_d0, "degree 0", (10, 45), fontFace=cv2.FONT_HERSHEY_COMPLEX, fontScale=1.5, thickness=2, color=(0, 0, 255))
-    image_d45 = image_list[1]
-    # cv2.putText(image_d45, "degree 45", (10, 45), fontFace=cv2.FONT_HERSHEY_COMPLEX, fontScale=1.5, thickness=2, color=(0, 0, 255))
-    image_d90 = image_list[2]
-    # cv2.putText(image_d90, "degree 90", (10, 45), fontFace=cv2.FONT_HERSHEY_COMPLEX, fontScale=1.5, thickness=2, color=(0, 0, 255))
-    image_d135 = image_list[3]
-    # cv2.putText(image_d135, "degree 135", (10, 45), fontFace=cv2.FONT_HERSHEY_COMPLEX, fontScale=1.5, thickness=2, color=(0, 0, 255))
-    img1 = np.concatenate((image_d0, image_d45), axis=1)
-    img2 = np.concatenate((image_d90, image_d135), axis=1)
-    image_cat = np.concatenate((img1, img2), axis=0)
-
-    return image_cat
-
-
-def save_images(image_lists, save_dir):
+    # Bulk load the cached streamable node file when it matches, otherwise
+    # write the nodes that differ in dependency order and cache the result
+    warm_start_configure(device, POLARIZED_NODE_CONFIG)
+    log_event('configured', 'Node Configure finished successfully!')
+
+
+def save_raw_frames(raw_frames, save_dir):
+    """
+    Saves the raw PolarizedAngles frames next to the images and releases
+    them.
+    """
     now = datetime.datetime.now()
-    now_string = str(now)
-    left_save_dir = f'''{save_dir[0]}/{now.year}-{now.month}-{now.day}'''
-    if not os.path.exists(left_save_dir):
-        os.makedirs(left_save_dir)
-    right_save_dir = f'''{save_dir[1]}/{now.year}-{now.month}-{now.day}'''
-    if not os.path.exists(right_save_dir):
-        os.makedirs(right_save_dir)
-
-    left_list, right_list = image_lists[0], image_lists[1]
-    cv2.imwrite('{}/{}_0.png'.format(left_save_dir,
-                                     time.strftime('left_%y-%m-%d-%H-%M-%S-',
-                                                   time.localtime(time.time())) + now_string[now_string.rfind('.') + 1:]), left_list[0])
-    cv2.imwrite('{}/{}_45.png'.format(left_save_dir,
-                                      time.strftime('left_%y-%m-%d-%H-%M-%S-',
-                                                    time.localtime(time.time())) + now_string[now_string.rfind('.') + 1:]), left_list[1])
-    cv2.imwrite('{}/{}_90.png'.format(left_save_dir,
-                                      time.strftime('left_%y-%m-%d-%H-%M-%S-',
-                                                    time.localtime(time.time())) + now_string[now_string.rfind('.') + 1:]), left_list[2])
-    cv2.imwrite('{}/{}_135.png'.format(left_save_dir,
-                                       time.strftime('left_%y-%m-%d-%H-%M-%S-',
-                                                     time.localtime(time.time())) + now_string[now_string.rfind('.') + 1:]), left_list[3])
-    # right
-    cv2.imwrite('{}/{}_0.png'.format(right_save_dir,
-                                     time.strftime('right_%y-%m-%d-%H-%M-%S-',
-                                                   time.localtime(time.time())) + now_string[now_string.rfind('.') + 1:]), right_list[0])
-    cv2.imwrite('{}/{}_45.png'.format(right_save_dir,
-                                      time.strftime('right_%y-%m-%d-%H-%M-%S-',
-                                                    time.localtime(time.time())) + now_string[now_string.rfind('.') + 1:]), right_list[1])
-    cv2.imwrite('{}/{}_90.png'.format(right_save_dir,
-                                      time.strftime('right_%y-%m-%d-%H-%M-%S-',
-                                                    time.localtime(time.time())) + now_string[now_string.rfind('.') + 1:]), right_list[2])
-    cv2.imwrite('{}/{}_135.png'.format(right_save_dir,
-                                       time.strftime('right_%y-%m-%d-%H-%M-%S-',
-                                                     time.localtime(time.time())) + now_string[now_string.rfind('.') + 1:]), right_list[3])
-
-    safe_print("image save in {}/{} at {}".format(left_save_dir, right_save_dir, now_string))
-
-
-def safe_print(*args, **kwargs):
-    with threading.Lock():
-        print(*args, **kwargs)
-
-
-def get_left_device_buffer(device):
+    for frame, directory, side in zip(raw_frames, save_dir, ['left', 'right']):
+        if frame is None:
+            continue
+        with frame:
+            frame_dir = f'''{directory}/{now.year}-{now.month}-{now.day}'''
+            if not os.path.exists(frame_dir):
+                os.makedirs(frame_dir)
+            np.save(f'''{frame_dir}/{side}_raw_{frame.frame_id}.npy''', frame.array)
+
+
+def save_frame_pair(frames, save_dir):
+    """
+    Saves a left/right pair of pooled frames (images and raw) and releases
+    them.
+    """
+    if None in frames:
+        save_raw_frames(frames, save_dir)
+        return
+    save_stereo_images([get_RGB8_image(frame.array) for frame in frames], save_dir,
+                       [frame.metadata for frame in frames])
+    save_raw_frames(frames, save_dir)
+
+
+def get_left_device_buffer(device, lifecycle, chunk_reader, monitor=None):
     global left_images
-    global isQuit
-    with device.start_stream(10):
-        while True:
-            buffer = device.get_buffer()
-            buffer_array = np.ctypeslib.as_array(buffer.pdata, (buffer.height, buffer.width, int(buffer.bits_per_pixel / 8))) \
-                .reshape(buffer.height, buffer.width, int(buffer.bits_per_pixel / 8))
-            left_images = get_RGB8_image(buffer_array)
-            if isQuit:
-                device.requeue_buffer(buffer)
-                break
-            device.requeue_buffer(buffer)
-    device.stop_stream()
-
-
-def get_right_device_buffer(device):
+    global left_metadata
+    # buffer count sized from the per frame service time seen during warm-up
+    tuner = BufferCountTuner(device, log=get_logger())
+    frame_pool = None
+    serial = device.nodemap['DeviceSerialNumber'].value
+    tuner.start()
+    while True:
+        # the time since the last got_buffer is what the stream buffers absorb
+        tuner.ready()
+        # None once shutdown was requested, within the get_buffer timeout
+        buffer = lifecycle.get_buffer(device)
+        if buffer is None:
+            break
+        tuner.got_buffer()
+        if monitor is not None:
+            # delivered frame rate against the budgeter's prediction
+            monitor.record(serial)
+        if frame_pool is None:
+            frame_pool = FramePool.for_buffer(buffer, size=8)
+        # one copy into the pool, then the buffer goes straight back
+        frame = frame_pool.copy_from(buffer)
+        left_metadata = chunk_reader.read(buffer)
+        device.requeue_buffer(buffer)
+        if frame is None:
+            # every slot is still held by a consumer; the log queue rate limits the repeats
+            log_event('frame_dropped', 'frame pool exhausted', device='left', level='WARNING')
+            continue
+        frame.metadata = left_metadata
+        left_images = get_RGB8_image(frame.array)
+        left_raw.publish(frame)
+    left_raw.clear()
+    tuner.stop()
+    if frame_pool is not None and frame_pool.exhausted_count:
+        log_event('frame_pool', f'{frame_pool.exhausted_count} frame(s) dropped, pool exhausted',
+                  device='left')
+
+
+def get_right_device_buffer(device, lifecycle, chunk_reader, monitor=None):
     global right_images
-    global isQuit
-    with device.start_stream(10):
-        while True:
-            buffer = device.get_buffer()
-            buffer_array = np.ctypeslib.as_array(buffer.pdata, (buffer.height, buffer.width, int(buffer.bits_per_pixel / 8))) \
-                .reshape(buffer.height, buffer.width, int(buffer.bits_per_pixel / 8))
-            right_images = get_RGB8_image(buffer_array)
-            if isQuit:
-                device.requeue_buffer(buffer)
-                break
-            device.requeue_buffer(buffer)
-    device.stop_stream()
-
-
-def example_entry_point():
-    # Create devices
-    global isQuit
-    serialNumber_list = []
-    save_dir = ["tri050S34(left)", "tri050S36(right)"]
-
-    devices = create_devices_with_tries()
-    for device in devices:
-        configure_some_nodes(device)
-        serialNumber_list.append(device.nodemap['DeviceSerialNumber'].value)
-    serialNumber_list_sorted = sorted(serialNumber_list)
-    if serialNumber_list[0] != serialNumber_list_sorted[0]:
-        devices = devices[::-1]
-    left_device, right_device = devices[0], devices[1]
-    left_thread = threading.Thread(target=get_left_device_buffer, args=(left_device,))
-    right_thread = threading.Thread(target=get_right_device_buffer, args=(right_device,))
-    left_thread.start()
-    right_thread.start()
-
-    time.sleep(5)
+    global right_metadata
+    # buffer count sized from the per frame service time seen during warm-up
+    tuner = BufferCountTuner(device, log=get_logger())
+    frame_pool = None
+    serial = device.nodemap['DeviceSerialNumber'].value
+    tuner.start()
     while True:
-        left_show_image = cv2.resize(get_cat_image(left_images), (612, 512))
-        right_show_image = cv2.resize(get_cat_image(right_images), (612, 512))
+        # the time since the last got_buffer is what the stream buffers absorb
+        tuner.ready()
+        # None once shutdown was requested, within the get_buffer timeout
+        buffer = lifecycle.get_buffer(device)
+        if buffer is None:
+            break
+        tuner.got_buffer()
+        if monitor is not None:
+            # delivered frame rate against the budgeter's prediction
+            monitor.record(serial)
+        if frame_pool is None:
+            frame_pool = FramePool.for_buffer(buffer, size=8)
+        # one copy into the pool, then the buffer goes straight back
+        frame = frame_pool.copy_from(buffer)
+        right_metadata = chunk_reader.read(buffer)
+        device.requeue_buffer(buffer)
+        if frame is None:
+            # every slot is still held by a consumer; the log queue rate limits the repeats
+            log_event('frame_dropped', 'frame pool exhausted', device='right', level='WARNING')
+            continue
+        frame.metadata = right_metadata
+        right_images = get_RGB8_image(frame.array)
+        right_raw.publish(frame)
+    right_raw.clear()
+    tuner.stop()
+    if frame_pool is not None and frame_pool.exhausted_count:
+        log_event('frame_pool', f'{frame_pool.exhausted_count} frame(s) dropped, pool exhausted',
+                  device='right')
+
+
+def serve_preview(lifecycle, save_dir, port=8080):
+    """
+    Headless replacement of the imshow loop: both cameras are served by a
+    PreviewServer, 's' and burst become POST /save and /burst?count=N.
+    Returns once shutdown was requested.
+    """
+    sources = {'left': left_raw, 'right': right_raw}
+
+    def save(frames):
+        if lifecycle.submit_save(save_frame_pair, [frames['left'], frames['right']], save_dir) is None:
+            for frame in frames.values():
+                if frame is not None:
+                    frame.release()
+
+    def on_save():
+        save({'left': left_raw.get(), 'right': right_raw.get()})
+        return 1
+
+    def on_burst(count):
+        lifecycle.start_thread(save_burst, sources, count, save, lifecycle.shutdown_event, name='burst')
+        return count
+
+    server = PreviewServer(sources, port=port, on_save=on_save, on_burst=on_burst)
+    server.start()
+    log_event('preview', f'http://{server.address[0]}:{port}/')
+    while lifecycle.is_running():
+        lifecycle.shutdown_event.wait(0.5)
+    server.stop()
+
+
+def example_entry_point(rig_config_path=None, headless=False, port=8080):
+    # Create only the devices of the rig
+    rig = load_rig_config(rig_config_path)
+    save_dir = [rig['left'].save_dir, rig['right'].save_dir]
+    # needs the devices, so it is created after them; a camera that reconnects
+    # before gets its budget from budgeter.configure()
+    budgeter = None
+
+    def reconfigure_device(device):
+        # a reconnected camera gets the rig setup again before its stream restarts
+        configure_some_nodes(device)
+        rig.apply_settings(device)
+        enable_frame_chunks(device.nodemap)
+        if budgeter is not None:
+            budgeter.apply(device)
+
+    # cameras that drop off the network are recreated, their threads wait meanwhile
+    manager = DeviceManager(configure=reconfigure_device)
+    devices = rig.create_devices(manager=manager)
+    # configure all cameras concurrently
+    warm_start_devices(devices, POLARIZED_NODE_CONFIG)
+    rig.apply_settings()
+    left_device, right_device = rig['left'].device, rig['right'].device
+    # chunks go into PayloadSize, so they are enabled before the budget reads it
+    left_chunk_reader = ChunkReader(enable_frame_chunks(left_device.nodemap))
+    right_chunk_reader = ChunkReader(enable_frame_chunks(right_device.nodemap))
+    # share the NIC between the cameras instead of running all at max FPS
+    budgeter = BandwidthBudgeter(devices)
+    budgeter.configure()
+    monitor = ThroughputMonitor(budgeter)
+    # 'q', Ctrl+C or SIGTERM stop the threads, finish the saves, then the devices
+    lifecycle = AcquisitionLifecycle(log=get_logger())
+    lifecycle.install_signal_handlers()
+    for device in devices:
+        lifecycle.add_device(device)
+    # lost/incomplete/resent counters at http://127.0.0.1:9110/ (Prometheus text)
+    stats_collector = StreamStatsCollector(devices, port=STREAM_STATS_PORT)
+    stats_collector.start()
+    lifecycle.start_thread(get_left_device_buffer, left_device, lifecycle, left_chunk_reader, monitor,
+                           name='left')
+    lifecycle.start_thread(get_right_device_buffer, right_device, lifecycle, right_chunk_reader, monitor,
+                           name='right')
+
+    if headless:
+        serve_preview(lifecycle, save_dir, port)
+        lifecycle.shutdown(destroy_devices=False)
+        stats_collector.stop()
+        manager.close()
+        return
+
+    while lifecycle.is_running() and not (left_images and right_images):
+        time.sleep(0.05)
+    while lifecycle.is_running():
+        left_show_image = cv2.resize(get_stereo_cat_image(left_images), (612, 512))
+        right_show_image = cv2.resize(get_stereo_cat_image(right_images), (612, 512))
         border = np.multiply(np.ones((512, 10, 3), dtype=np.uint8), 255)
         show_image = np.concatenate((left_show_image, border, right_show_image), axis=1)
         cv2.imshow("Left || Right", show_image)
         key = cv2.waitKey(1)
         if key & 0xFF == ord("q"):
-            cv2.destroyWindow("Left || Right")
-            isQuit = True
-            left_thread.join()
-            right_thread.join()
             break
         elif key & 0xFF == ord("s"):
             image_lists = [left_images, right_images]
-            save_images(image_lists, save_dir)
+            lifecycle.submit_save(save_stereo_images, image_lists, save_dir, [left_metadata, right_metadata])
+            raw_frames = [left_raw.get(), right_raw.get()]
+            if lifecycle.submit_save(save_raw_frames, raw_frames, save_dir) is None:
+                for frame in raw_frames:
+                    if frame is not None:
+                        frame.release()
 
-    system.destroy_device()
+    cv2.destroyAllWindows()
+    lifecycle.shutdown(destroy_devices=False)
+    stats_collector.stop()
+    manager.close()
 
 
 if __name__ == '__main__':
     print('\nAcquisition started via multi device\n')
-    example_entry_point()
+    # --headless serves the live view at http://127.0.0.1:8080/ instead of a window
+    arguments = [argument for argument in sys.argv[1:] if argument != '--headless']
+    example_entry_point(arguments[0] if arguments else None, headless='--headless' in sys.argv)
     print('\nAcquisition finished successfully')
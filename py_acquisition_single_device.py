@@ -1,165 +1,255 @@
 # @Author:ZhangZl
 # @Date:30/11/2021
-import datetime
-import os
-import threading
-import time
+import sys
 
 import cv2
 import numpy as np
 from arena_api import enums
 from arena_api.buffer import BufferFactory
-from arena_api.system import system
+
+from acquisition_profiles import ProfileSwitcher
+from chunk_meta import ChunkReader, CrcValidator, enable_frame_chunks
+from device_manager import DeviceManager, create_devices_with_backoff
+from device_wrapper import CachedDevice
+from frame_pool import FramePool, LatestFrame
+from latency import ClockOffsetEstimator, EndToEndLatency
+from lifecycle import AcquisitionLifecycle
+from log_queue import get_logger, log_event
+from node_config import POLARIZED_NODE_CONFIG
+from preview_server import PREVIEW_FPS, PreviewServer, save_burst
+from stage_timing import StageTracer, install_dump_signal, unregister_tracer
+from stream_stats import STREAM_STATS_PORT, StreamStatsCollector
+from utils import get_cat_image, save_images
+from warm_start import warm_start_configure
+
+PROFILE_KEYS = {ord('p'): 'preview', ord('r'): 'record', ord('b'): 'burst'}
+TRACE_STAGES = ['get_buffer', 'as_array', 'cvtColor', 'putText', 'concatenate', 'imshow', 'waitKey']
 
 
 def create_devices_with_tries():
     """
-    This function waits for the user to connect a device before raising
-    an exception
+    This function waits up to 60 seconds for the user to connect a device
+    before raising an exception, polling with a short backoff
     """
-
-    tries = 0
-    tries_max = 6
-    sleep_time_secs = 10
-    while tries < tries_max:  # Wait for device for 60 seconds
-        devices = system.create_device()
-        if not devices:
-            print(
-                f'Try {tries + 1} of {tries_max}: waiting for {sleep_time_secs} '
-                f'secs for a device to be connected!')
-            for sec_count in range(sleep_time_secs):
-                time.sleep(1)
-                print(f'{sec_count + 1} seconds passed ',
-                      '.' * sec_count, end='\r')
-            tries += 1
-        else:
-            print(f'Created {len(devices)} device(s)')
-            return devices
-    else:
-        raise Exception(f'No device found! Please connect a device and run '
-                        f'the example again.')
+    return create_devices_with_backoff(timeout_s=60)
 
 
 def configure_some_nodes(device):
-    tl_stream_nodemap = device.tl_stream_nodemap
-    # Enable stream auto negotiate packet size
-    tl_stream_nodemap['StreamAutoNegotiatePacketSize'].value = True
-    # Enable stream packet resend
-    tl_stream_nodemap['StreamPacketResendEnable'].value = True
-    # make sure the device sends images continuously
-
-    nodemap = device.nodemap
-    nodemap['AcquisitionMode'].value = 'Continuous'
-    # white balance
-    nodemap['BalanceWhiteEnable'].value = True
-    nodemap['BalanceWhiteAuto'].value = 'Continuous'
-    # ExposureAuto
-    nodemap['ExposureAuto'].value = 'Continuous'
-    # Gain
-    nodemap['GainAuto'].value = 'Off'
-    # nodemap['Gain'].value = nodemap['Gain'].max
-
-    # automate the calculation of max FPS whenever the device settings change
-    nodemap['AcquisitionFrameRateEnable'].value = True
-    # set FPS node to max FPS which was set to be automatically calculated
-    # base on current device settings
-    nodemap['AcquisitionFrameRate'].value = nodemap['AcquisitionFrameRate'].max
-    # max FPS according to the current settings
-    nodemap['DeviceStreamChannelPacketSize'].value = nodemap['DeviceStreamChannelPacketSize'].max
-
-    # Set features before streaming.-------------------------------------------
-    nodes = device.nodemap.get_node(['Width', 'Height', 'PixelFormat'])
-    # Set width and height to their max values
-    nodes['Width'].value = nodes['Width'].max
-    nodes['Height'].value = nodes['Height'].max
-    nodes['PixelFormat'].value = "PolarizedAngles_0d_45d_90d_135d_BayerRG8"
-    safe_print(f'Node Configure finished successfully!')
-
-
-def get_cat_image(buffer_array):
-    image_d0 = cv2.cvtColor(buffer_array[:, :, 0], cv2.COLOR_BayerRG2RGB)
-    cv2.putText(image_d0, "degree 0", (10, 45), fontFace=cv2.FONT_HERSHEY_COMPLEX, fontScale=1.5, thickness=2, color=(0, 0, 255))
-    image_d45 = cv2.cvtColor(buffer_array[:, :, 1], cv2.COLOR_BayerRG2RGB)
-    cv2.putText(image_d45, "degree 45", (10, 45), fontFace=cv2.FONT_HERSHEY_COMPLEX, fontScale=1.5, thickness=2, color=(0, 0, 255))
-    image_d90 = cv2.cvtColor(buffer_array[:, :, 2], cv2.COLOR_BayerRG2RGB)
-    cv2.putText(image_d90, "degree 90", (10, 45), fontFace=cv2.FONT_HERSHEY_COMPLEX, fontScale=1.5, thickness=2, color=(0, 0, 255))
-    image_d135 = cv2.cvtColor(buffer_array[:, :, 3], cv2.COLOR_BayerRG2RGB)
-    cv2.putText(image_d135, "degree 135", (10, 45), fontFace=cv2.FONT_HERSHEY_COMPLEX, fontScale=1.5, thickness=2, color=(0, 0, 255))
-    img1 = np.concatenate((image_d0, image_d45), axis=1)
-    img2 = np.concatenate((image_d90, image_d135), axis=1)
-    img = np.concatenate((img1, img2), axis=0)
-    return img
+    # Bulk load the cached streamable node file when it matches, otherwise
+    # write the nodes that differ in dependency order and cache the result
+    warm_start_configure(device, POLARIZED_NODE_CONFIG)
+    log_event('configured', 'Node Configure finished successfully!')
 
 
-def convert_BayerRG8_to_RGB8(buffer):
-    return BufferFactory.convert(buffer, new_pixel_format=enums.PixelFormat.RGB8)
+def reconfigure_device(device):
+    """
+    DeviceManager configure callback: sets a reconnected camera up the way
+    get_single_device_buffer did before its stream is restarted.
+    """
+    configure_some_nodes(device)
+    enable_frame_chunks(device.nodemap)
 
 
-def save_images(buffer_array, save_dir):
-    now = datetime.datetime.now()
-    save_dir = f'''{save_dir}/{now.year}-{now.month}-{now.day}'''
-    if not os.path.exists(save_dir):
-        os.makedirs(save_dir)
-    a = str(now)
-    image_d0 = cv2.cvtColor(buffer_array[:, :, 0], cv2.COLOR_BayerRG2RGB)
-    cv2.imwrite('{}/{}_0.png'.format(save_dir,
-                                     time.strftime('%y-%m-%d-%H-%M-%S-',
-                                                   time.localtime(time.time())) + a[a.rfind('.') + 1:]), image_d0)
-    image_d45 = cv2.cvtColor(buffer_array[:, :, 1], cv2.COLOR_BayerRG2RGB)
-    cv2.imwrite('{}/{}_45.png'.format(save_dir,
-                                      time.strftime('%y-%m-%d-%H-%M-%S-',
-                                                    time.localtime(time.time())) + a[a.rfind('.') + 1:]), image_d45)
-    image_d90 = cv2.cvtColor(buffer_array[:, :, 2], cv2.COLOR_BayerRG2RGB)
-    cv2.imwrite('{}/{}_90.png'.format(save_dir,
-                                      time.strftime('%y-%m-%d-%H-%M-%S-',
-                                                    time.localtime(time.time())) + a[a.rfind('.') + 1:]), image_d90)
-    image_d135 = cv2.cvtColor(buffer_array[:, :, 3], cv2.COLOR_BayerRG2RGB)
-    cv2.imwrite('{}/{}_135.png'.format(save_dir,
-                                       time.strftime('%y-%m-%d-%H-%M-%S-',
-                                                     time.localtime(time.time())) + a[a.rfind('.') + 1:]), image_d135)
-    safe_print("image save in {} at {}".format(save_dir, a))
-
-
-def safe_print(*args, **kwargs):
+def create_managed_devices():
     """
-    This function ensures resource access is locked to a single thread
+    Like create_devices_with_tries, but the devices are recreated,
+    reconfigured and restarted when they drop off the network. Close the
+    returned manager instead of calling system.destroy_device().
     """
-    with threading.Lock():
-        print(*args, **kwargs)
+    manager = DeviceManager(configure=reconfigure_device, timeout_s=60)
+    return manager, manager.open()
+
+
+def convert_BayerRG8_to_RGB8(buffer):
+    return BufferFactory.convert(buffer, new_pixel_format=enums.PixelFormat.RGB8)
 
 
-def get_single_device_buffer(device):
+def get_single_device_buffer(device, validate_crc=False, trace=False, measure_latency=False, lifecycle=None):
     configure_some_nodes(device)
-    thread_id = f'''{device.nodemap['DeviceModelName'].value}''' \
-                f'''-{device.nodemap['DeviceSerialNumber'].value} |'''
+    # exposure/gain/timestamp travel with every frame as chunk data
+    chunk_reader = ChunkReader(enable_frame_chunks(device.nodemap))
+    crc_validator = CrcValidator() if validate_crc else None
+    if crc_validator is not None:
+        crc_validator.start()
+    # static nodes are read once and served from the wrapper's cache
+    device = CachedDevice(device)
+    thread_id = f'''{device.thread_id} |'''
     save_dir = f'''{thread_id[:-2]}'''
-
-    with device.start_stream(10):
-        while True:
-            buffer = device.get_buffer()
-            buffer_array = np.ctypeslib.as_array(buffer.pdata, (buffer.height, buffer.width, int(buffer.bits_per_pixel / 8))) \
-                .reshape(buffer.height, buffer.width, int(buffer.bits_per_pixel / 8))
-            img = get_cat_image(buffer_array)
-            cv2.imshow(f'''Win-{thread_id[:-2]}''', cv2.resize(img, (612, 512)))
-            key = cv2.waitKey(1)
-            if key & 0xFF == ord("q"):
-                device.requeue_buffer(buffer)
-                cv2.destroyWindow(f'''Win-{thread_id[:-2]}''')
-                break
-            elif key & 0xFF == ord("s"):
-                # print(f'''frame id {buffer.frame_id}''')
-                save_images(buffer_array, save_dir)
+    # per stage histograms, dumped with 't', on SIGUSR1 and at shutdown
+    tracer = StageTracer(thread_id[:-2], TRACE_STAGES) if trace else None
+    # age of the frame from exposure start to display/save, shown on screen
+    latency = EndToEndLatency(ClockOffsetEstimator(device)) if measure_latency else None
+    if latency is not None:
+        latency.estimator.start()
+
+    # shared with the other cameras when passed in, shut down by the caller then
+    own_lifecycle = lifecycle is None
+    if own_lifecycle:
+        lifecycle = AcquisitionLifecycle(log=get_logger())
+
+    # 'p', 'r' and 'b' switch between the preview, record and burst profiles
+    profile_switcher = ProfileSwitcher(device)
+    profile_switcher.switch('preview')
+    while True:
+        if tracer is not None:
+            tracer.start()
+        buffer = lifecycle.get_buffer(device)
+        if buffer is None:
+            break
+        if tracer is not None:
+            tracer.mark('get_buffer')
+        if buffer.is_incomplete:
+            # counted by the stream statistics, not worth displaying
             device.requeue_buffer(buffer)
-
-    device.stop_stream()
+            continue
+        buffer_array = np.ctypeslib.as_array(buffer.pdata, (buffer.height, buffer.width, int(buffer.bits_per_pixel / 8))) \
+            .reshape(buffer.height, buffer.width, int(buffer.bits_per_pixel / 8))
+        if tracer is not None:
+            tracer.mark('as_array')
+        metadata = chunk_reader.read(buffer)
+        if crc_validator is not None:
+            crc_validator.submit(metadata, buffer_array)
+        img = get_cat_image(buffer_array, tracer,
+                            latency.get_last_ms('display') if latency is not None else None)
+        cv2.imshow(f'''Win-{thread_id[:-2]}''', cv2.resize(img, (612, 512)))
+        if tracer is not None:
+            tracer.mark('imshow')
+        key = cv2.waitKey(1)
+        if tracer is not None:
+            tracer.mark('waitKey')
+        if latency is not None:
+            latency.record('display', metadata.timestamp_ns)
+        if key & 0xFF == ord("q"):
+            device.requeue_buffer(buffer)
+            cv2.destroyWindow(f'''Win-{thread_id[:-2]}''')
+            break
+        elif key & 0xFF == ord("s"):
+            # print(f'''frame id {buffer.frame_id}''')
+            # the copy outlives the requeued buffer
+            save_job = lifecycle.submit_save(save_images, buffer_array.copy(), save_dir, metadata)
+            if latency is not None and save_job is not None:
+                save_job.add_done_callback(lambda job, timestamp_ns=metadata.timestamp_ns:
+                                           latency.record('save', timestamp_ns))
+        elif key & 0xFF == ord("t") and tracer is not None:
+            log_event('stage_timing', tracer.format_summary(), device=thread_id[:-2])
+        elif key & 0xFF in PROFILE_KEYS:
+            device.requeue_buffer(buffer)
+            profile_switcher.switch(PROFILE_KEYS[key & 0xFF])
+            log_event('profile', profile_switcher.profile, device=thread_id[:-2])
+            continue
+        device.requeue_buffer(buffer)
+
+    profile_switcher.stop()
+    if own_lifecycle:
+        # waits for the queued saves
+        lifecycle.shutdown(destroy_devices=False)
+    if crc_validator is not None:
+        crc_validator.stop()
+        log_event('crc', f'{crc_validator.failed_count}/{crc_validator.checked_count} CRC failures', device=thread_id[:-2])
+    if tracer is not None:
+        unregister_tracer(tracer)
+        log_event('stage_timing', tracer.format_summary(), device=thread_id[:-2])
+    if latency is not None:
+        latency.estimator.stop()
+        log_event('latency', latency.format_summary(), device=thread_id[:-2])
     # system.destroy_device()
-    safe_print(f'''Shutdown devices {thread_id[:-2]}''')
+    log_event('shutdown', f'''Shutdown devices {thread_id[:-2]}''', device=thread_id[:-2])
+
+
+def save_pooled_frame(frame, save_dir):
+    # releases the frame once it is written
+    with frame:
+        save_images(frame.array, save_dir, frame.metadata)
+
+
+def serve_single_device_buffer(device, lifecycle, port=8080, preview_fps=PREVIEW_FPS, profile='record'):
+    """
+    Headless get_single_device_buffer: the newest frame is published for
+    the PreviewServer instead of shown with imshow, saves and bursts are
+    requested over HTTP (POST /save, POST /burst?count=N). The stream runs
+    with an acquisition profile, 'record' by default: every frame at the
+    configured rate, the preview rate is the server's business.
+    """
+    configure_some_nodes(device)
+    chunk_reader = ChunkReader(enable_frame_chunks(device.nodemap))
+    device = CachedDevice(device)
+    save_dir = device.thread_id
+    latest = LatestFrame()
+    sources = {save_dir: latest}
+
+    def save(frames):
+        for frame in frames.values():
+            if frame is not None and lifecycle.submit_save(save_pooled_frame, frame, save_dir) is None:
+                frame.release()
+
+    def on_save():
+        frame = latest.get()
+        if frame is None:
+            return 0
+        save({save_dir: frame})
+        return 1
+
+    def on_burst(count):
+        lifecycle.start_thread(save_burst, sources, count, save, lifecycle.shutdown_event, name='burst')
+        return count
+
+    server = PreviewServer(sources, port=port, preview_fps=preview_fps, on_save=on_save, on_burst=on_burst)
+    server.start()
+    log_event('preview', f'http://{server.address[0]}:{port}/', device=save_dir)
+
+    # the latest frame, encodes in flight and queued saves hold pool frames
+    frame_pool = None
+    profile_switcher = ProfileSwitcher(device)
+    profile_switcher.switch(profile)
+    log_event('profile', profile_switcher.profile, device=save_dir)
+    while True:
+        buffer = lifecycle.get_buffer(device)
+        if buffer is None:
+            break
+        if buffer.is_incomplete:
+            device.requeue_buffer(buffer)
+            continue
+        if frame_pool is None:
+            frame_pool = FramePool.for_buffer(buffer, size=16)
+        frame = frame_pool.copy_from(buffer)
+        if frame is not None:
+            frame.metadata = chunk_reader.read(buffer)
+        device.requeue_buffer(buffer)
+        if frame is None:
+            # every slot is still held by an encode or a save; the log queue rate limits the repeats
+            log_event('frame_dropped', 'frame pool exhausted', device=save_dir, level='WARNING')
+            continue
+        latest.publish(frame)
+
+    server.stop()
+    latest.clear()
+    profile_switcher.stop()
+    log_event('shutdown', f'''Shutdown devices {save_dir}''', device=save_dir,
+              encoded=server.encoded_count, skipped=server.skipped_count,
+              pool_exhausted=frame_pool.exhausted_count if frame_pool is not None else 0)
 
 
 if __name__ == '__main__':
     print('\nAcquisition started via single device\n')
-    devices = create_devices_with_tries()
+    manager, devices = create_managed_devices()
     device = devices[0]
     print(f'Device used in the example:\n\t{device}')
-    get_single_device_buffer(device)
+    trace = '--trace' in sys.argv
+    if trace:
+        install_dump_signal()
+    lifecycle = AcquisitionLifecycle(log=get_logger())
+    lifecycle.install_signal_handlers()
+    lifecycle.add_device(device)
+    # lost/incomplete/resent counters at http://127.0.0.1:9110/ (Prometheus text)
+    stats_collector = StreamStatsCollector([device], port=STREAM_STATS_PORT)
+    stats_collector.start()
+    if '--headless' in sys.argv:
+        # live view and save/burst at http://127.0.0.1:8080/, Ctrl+C to stop
+        serve_single_device_buffer(device, lifecycle)
+    else:
+        get_single_device_buffer(device, trace=trace, measure_latency='--latency' in sys.argv,
+                                 lifecycle=lifecycle)
+    lifecycle.shutdown(destroy_devices=False)
+    stats_collector.stop()
+    manager.close()
     print('\nAcquisition finished successfully')
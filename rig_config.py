@@ -0,0 +1,148 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+import json
+
+from arena_api.system import system
+
+from device_manager import poll_with_backoff
+from log_queue import log_event
+
+# Stereo rig of two TRI050S cameras. A camera is matched by 'serial' or by
+# 'mac' (format XX:XX:XX:XX:XX:XX as in system.device_infos); a camera with
+# neither takes any remaining device, in serial order. 'settings' are node
+# values written after the common configuration.
+# Without a configuration file any two cameras are used, the lower serial
+# on the left.
+DEFAULT_RIG = {
+    'cameras': [
+        {'role': 'left', 'save_dir': 'tri050S34(left)', 'settings': {}},
+        {'role': 'right', 'save_dir': 'tri050S36(right)', 'settings': {}},
+    ]
+}
+
+
+class CameraRole:
+    """
+    One camera of the rig: how to find it and what to do with it.
+    """
+
+    def __init__(self, role, serial=None, mac=None, save_dir=None, settings=None):
+        self.role = role
+        self.serial = serial
+        self.mac = mac.lower() if mac is not None else None
+        self.save_dir = save_dir if save_dir is not None else role
+        self.settings = settings or {}
+        self.device_info = None
+        self.device = None
+
+    @property
+    def is_pinned(self):
+        return self.serial is not None or self.mac is not None
+
+    def matches(self, device_info):
+        if self.serial is not None and device_info['serial'] != self.serial:
+            return False
+        if self.mac is not None and device_info['mac'].lower() != self.mac:
+            return False
+        return True
+
+    def __repr__(self):
+        return f'CameraRole({self.role}, serial={self.serial}, mac={self.mac})'
+
+
+class RigConfig:
+    """
+    Maps cameras to roles, output directories and settings. Only the
+    cameras of the rig are created, other cameras on the subnet are left
+    untouched.
+    """
+
+    def __init__(self, cameras):
+        self.cameras = [CameraRole(**camera) for camera in cameras]
+        roles = [camera.role for camera in self.cameras]
+        if len(set(roles)) != len(roles):
+            raise ValueError(f'Duplicated roles in rig configuration: {roles}')
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r') as file:
+            return cls(json.load(file)['cameras'])
+
+    def __getitem__(self, role):
+        for camera in self.cameras:
+            if camera.role == role:
+                return camera
+        raise KeyError(role)
+
+    @property
+    def save_dirs(self):
+        return [camera.save_dir for camera in self.cameras]
+
+    def match_device_infos(self, device_infos):
+        """
+        Returns the device info of every camera role in rig order, or None
+        while a camera is still missing. Cameras pinned by serial or MAC are
+        matched first, the others take the remaining devices in serial order.
+        """
+        matched = {}
+        remaining = sorted(device_infos, key=lambda device_info: device_info['serial'])
+        for camera in sorted(self.cameras, key=lambda camera: not camera.is_pinned):
+            for device_info in remaining:
+                if camera.matches(device_info):
+                    matched[camera.role] = device_info
+                    remaining.remove(device_info)
+                    break
+            else:
+                return None
+        return [matched[camera.role] for camera in self.cameras]
+
+    def create_devices(self, timeout_s=60, manager=None):
+        """
+        Waits for the rig's cameras and creates only those devices, as
+        ManagedDevices of manager when one is given (see DeviceManager).
+        Returns the devices in rig order.
+        """
+        try:
+            device_infos = poll_with_backoff(self.match_device_infos, timeout_s)
+        except TimeoutError:
+            missing = [camera for camera in self.cameras
+                       if not any(camera.matches(info) for info in system.device_infos)]
+            raise TimeoutError(f'Rig cameras not found within {timeout_s} s: {missing or self.cameras} '
+                               f'({len(system.device_infos)} device(s) found)') from None
+        if manager is not None:
+            devices = manager.open(device_infos)
+        else:
+            devices = system.create_device(device_infos=device_infos)
+        for camera, device_info, device in zip(self.cameras, device_infos, devices):
+            camera.device_info = device_info
+            camera.device = device
+        log_event('devices_created', f'Created {len(devices)} rig device(s): '
+                                     f'''{', '.join(f'{camera.role}={camera.device_info["serial"]}' for camera in self.cameras)}''')
+        return devices
+
+    def apply_settings(self, device=None):
+        """
+        Writes the per role node values to the created devices, or only to
+        device (e.g. a reconnected handle), matched by serial.
+        """
+        serial = device.nodemap['DeviceSerialNumber'].value if device is not None else None
+        for camera in self.cameras:
+            if device is None:
+                nodemap = camera.device.nodemap
+            elif camera.device_info['serial'] == serial:
+                nodemap = device.nodemap
+            else:
+                continue
+            for node_name, value in camera.settings.items():
+                nodemap[node_name].value = value
+
+
+def load_rig_config(path=None):
+    """
+    Loads a rig configuration from a JSON file, or the default stereo rig
+    of any two cameras.
+    """
+    if path is None:
+        return RigConfig(DEFAULT_RIG['cameras'])
+    return RigConfig.from_file(path)
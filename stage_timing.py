@@ -0,0 +1,180 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+import signal
+import threading
+import time
+
+from log_queue import log_event
+
+# 2 ** SUB_BUCKET_BITS buckets per power of two, about 3% resolution
+SUB_BUCKET_BITS = 5
+# Values up to 2 ** MAX_VALUE_BITS ns (about 18 minutes) are recorded exactly
+MAX_VALUE_BITS = 40
+
+
+class LatencyHistogram:
+    """
+    Fixed size log-linear histogram of nanosecond values in the style of
+    HdrHistogram: values below 2 ** (SUB_BUCKET_BITS + 1) get a bucket of
+    their own, above that every power of two is split into
+    2 ** SUB_BUCKET_BITS buckets. Recording is an integer shift and a list
+    increment, nothing is allocated.
+    """
+
+    def __init__(self, sub_bucket_bits=SUB_BUCKET_BITS, max_value_bits=MAX_VALUE_BITS):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.direct_bits = sub_bucket_bits + 1
+        self.counts = [0] * ((max_value_bits - sub_bucket_bits + 1) * self.sub_bucket_count)
+        self.total_count = 0
+        self.max_ns = 0
+
+    def get_index(self, value_ns):
+        bit_length = value_ns.bit_length()
+        if bit_length <= self.direct_bits:
+            return value_ns
+        shift = bit_length - self.direct_bits
+        index = (shift + 1) * self.sub_bucket_count + (value_ns >> shift) - self.sub_bucket_count
+        return min(index, len(self.counts) - 1)
+
+    def get_value(self, index):
+        """
+        Returns the middle of the value range of a bucket.
+        """
+        if index < 2 * self.sub_bucket_count:
+            return index
+        shift = index // self.sub_bucket_count - 1
+        lowest = (index % self.sub_bucket_count + self.sub_bucket_count) << shift
+        return lowest + (1 << shift) // 2
+
+    def record(self, value_ns):
+        self.counts[self.get_index(value_ns)] += 1
+        self.total_count += 1
+        if value_ns > self.max_ns:
+            self.max_ns = value_ns
+
+    def get_percentile(self, percentile):
+        if not self.total_count:
+            return 0
+        target = max(1, int(self.total_count * percentile / 100 + 0.5))
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return min(self.get_value(index), self.max_ns)
+        return self.max_ns
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.total_count = 0
+        self.max_ns = 0
+
+
+class StageTracer:
+    """
+    Per device stage timing of the acquisition loop. start() stamps the
+    beginning of an iteration, mark(stage) records the time since the
+    previous stamp into the stage's histogram. The loops only call it when
+    a tracer was created, so disabled tracing costs a None check.
+    """
+
+    def __init__(self, name, stages=()):
+        self.name = name
+        self.histograms = {stage: LatencyHistogram() for stage in stages}
+        self._last_ns = 0
+        self._lock = threading.Lock()
+        register_tracer(self)
+
+    def start(self):
+        self._last_ns = time.perf_counter_ns()
+
+    def mark(self, stage):
+        now_ns = time.perf_counter_ns()
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(stage, LatencyHistogram())
+        histogram.record(now_ns - self._last_ns)
+        self._last_ns = now_ns
+
+    def summary_us(self):
+        """
+        Returns {stage: {'count', 'p50_us', 'p99_us', 'max_us'}} in pipeline
+        order.
+        """
+        with self._lock:
+            histograms = list(self.histograms.items())
+        return {stage: {'count': histogram.total_count,
+                        'p50_us': histogram.get_percentile(50) / 1000,
+                        'p99_us': histogram.get_percentile(99) / 1000,
+                        'max_us': histogram.max_ns / 1000}
+                for stage, histogram in histograms}
+
+    def format_summary(self):
+        lines = [f'Stage timing {self.name}:']
+        for stage, stats in self.summary_us().items():
+            lines.append(f'''  {stage:<12} n={stats['count']:<8} p50={stats['p50_us']:10.1f}us '''
+                         f'''p99={stats['p99_us']:10.1f}us max={stats['max_us']:10.1f}us''')
+        return '\n'.join(lines)
+
+
+_tracers = []
+_tracers_lock = threading.Lock()
+# Set by the signal handler, the dump itself runs on the stage-dump thread
+_dump_requested = threading.Event()
+_dump_thread = None
+
+
+def register_tracer(tracer):
+    with _tracers_lock:
+        _tracers.append(tracer)
+
+
+def unregister_tracer(tracer):
+    """
+    Stops dumping a tracer whose device went away.
+    """
+    with _tracers_lock:
+        if tracer in _tracers:
+            _tracers.remove(tracer)
+
+
+def dump_all():
+    """
+    Logs the summary of every tracer.
+    """
+    with _tracers_lock:
+        tracers = list(_tracers)
+    for tracer in tracers:
+        log_event('stage_timing', tracer.format_summary(), device=tracer.name)
+
+
+def _dump_loop():
+    while True:
+        _dump_requested.wait()
+        _dump_requested.clear()
+        dump_all()
+
+
+def request_dump(*args):
+    """
+    Signal handler: the main thread may be inside one of the locks
+    dump_all takes, so the handler only wakes the stage-dump thread.
+    """
+    _dump_requested.set()
+
+
+def install_dump_signal(signal_number=getattr(signal, 'SIGUSR1', None)):
+    """
+    Dumps all tracers on SIGUSR1 (kill -USR1 <pid>). Must be called from
+    the main thread; does nothing on platforms without the signal.
+    """
+    global _dump_thread
+    if signal_number is None or threading.current_thread() is not threading.main_thread():
+        return False
+    if _dump_thread is None:
+        _dump_thread = threading.Thread(target=_dump_loop, daemon=True, name='stage-dump')
+        _dump_thread.start()
+    signal.signal(signal_number, request_dump)
+    return True
@@ -0,0 +1,184 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bandwidth import get_frame_bytes
+from log_queue import log_event
+
+# tl_stream_nodemap counters -> (metric name, help text)
+STREAM_COUNTERS = {
+    'StreamLostFrameCount': ('stream_lost_frames_total', 'Frames lost by the stream'),
+    'StreamIncompleteFrameCount': ('stream_incomplete_frames_total', 'Frames delivered incomplete'),
+    'StreamResendPacketCount': ('stream_resend_packets_total', 'Packets resent by the camera'),
+    'StreamMissedPacketCount': ('stream_missed_packets_total', 'Packets never received'),
+    'StreamReceivedFrameCount': ('stream_received_frames_total', 'Frames received by the stream'),
+}
+METRIC_PREFIX = 'polarized_'
+# Local Prometheus endpoint of the acquisition scripts
+STREAM_STATS_PORT = 9110
+
+
+class StreamSample:
+    """
+    Counter values of one device at one point in time, with the delivered
+    frame rate and payload bandwidth since the previous sample.
+    """
+
+    def __init__(self, serial, counters, fps=0.0, bandwidth_bps=0.0):
+        self.serial = serial
+        self.counters = counters
+        self.fps = fps
+        self.bandwidth_bps = bandwidth_bps
+
+
+def read_stream_counters(tl_stream_nodemap, node_names=STREAM_COUNTERS):
+    """
+    Returns {node name: value} of the counters the stream offers.
+    """
+    counters = {}
+    for node_name in node_names:
+        try:
+            counters[node_name] = tl_stream_nodemap[node_name].value
+        except KeyError:
+            continue
+    return counters
+
+
+def format_prometheus(samples):
+    """
+    Renders the samples in the Prometheus text exposition format.
+    """
+    lines = []
+    for node_name, (metric_name, help_text) in STREAM_COUNTERS.items():
+        metric_lines = [f'{METRIC_PREFIX}{metric_name}{{serial="{sample.serial}"}} {sample.counters[node_name]}'
+                        for sample in samples if node_name in sample.counters]
+        if metric_lines:
+            lines.append(f'# HELP {METRIC_PREFIX}{metric_name} {help_text}')
+            lines.append(f'# TYPE {METRIC_PREFIX}{metric_name} counter')
+            lines.extend(metric_lines)
+    for metric_name, help_text, attribute in [
+            ('stream_delivered_fps', 'Frames per second delivered to the host', 'fps'),
+            ('stream_bandwidth_bps', 'Payload bits per second delivered to the host', 'bandwidth_bps')]:
+        lines.append(f'# HELP {METRIC_PREFIX}{metric_name} {help_text}')
+        lines.append(f'# TYPE {METRIC_PREFIX}{metric_name} gauge')
+        lines.extend(f'{METRIC_PREFIX}{metric_name}{{serial="{sample.serial}"}} {getattr(sample, attribute):.3f}'
+                     for sample in samples)
+    return '\n'.join(lines) + '\n'
+
+
+class StreamStatsCollector(threading.Thread):
+    """
+    Samples the stream statistics of every device at a low rate and
+    exports them in Prometheus text format, to a file written atomically
+    (for the node exporter's textfile collector) and/or a local HTTP
+    endpoint. Reading a handful of stream nodes once a second does not
+    touch the acquisition threads.
+    """
+
+    def __init__(self, devices, interval_s=1.0, output_path=None, port=None):
+        super().__init__(daemon=True, name='stream-stats')
+        self.devices = devices
+        self.interval_s = interval_s
+        self.output_path = output_path
+        self.port = port
+        self.samples = []
+        self.text = format_prometheus([])
+        self._previous = {}
+        self._stop_event = threading.Event()
+        self._server = None
+
+    def sample(self):
+        now = time.monotonic()
+        samples = []
+        for device in self.devices:
+            serial = device.nodemap['DeviceSerialNumber'].value
+            counters = read_stream_counters(device.tl_stream_nodemap)
+            sample = StreamSample(serial, counters)
+            received = counters.get('StreamReceivedFrameCount')
+            previous = self._previous.get(serial)
+            if received is not None and previous is not None:
+                elapsed = now - previous[0]
+                frames = received - previous[1]
+                if elapsed > 0 and frames >= 0:
+                    sample.fps = frames / elapsed
+                    sample.bandwidth_bps = sample.fps * get_frame_bytes(device.nodemap) * 8
+            if received is not None:
+                self._previous[serial] = (now, received)
+            samples.append(sample)
+        self.samples = samples
+        self.text = format_prometheus(samples)
+        return samples
+
+    def export(self):
+        if self.output_path is None:
+            return
+        temp_path = f'{self.output_path}.tmp'
+        with open(temp_path, 'w') as file:
+            file.write(self.text)
+        os.replace(temp_path, self.output_path)
+
+    def _serve(self):
+        collector = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = collector.text.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', self.port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def run(self):
+        if self.port is not None:
+            try:
+                self._serve()
+            except OSError as exception:
+                # e.g. another acquisition script already exports on the port
+                log_event('stream_stats_serve_failed', str(exception), level='WARNING', port=self.port)
+        while not self._stop_event.is_set():
+            try:
+                self.sample()
+                self.export()
+            except Exception as exception:
+                # a device being reconnected has no stream nodemap for a moment
+                log_event('stream_stats_failed', str(exception), level='WARNING')
+            self._stop_event.wait(self.interval_s)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+if __name__ == '__main__':
+    from py_acquisition_single_device import create_devices_with_tries
+
+    devices = create_devices_with_tries()
+    collector = StreamStatsCollector(devices, output_path='stream_stats.prom', port=STREAM_STATS_PORT)
+    for device in devices:
+        device.start_stream(10)
+    collector.start()
+    end_time = time.monotonic() + 30
+    while time.monotonic() < end_time:
+        for device in devices:
+            try:
+                device.requeue_buffer(device.get_buffer(timeout=2000))
+            except TimeoutError:
+                pass
+    collector.stop()
+    for device in devices:
+        device.stop_stream()
+    print(collector.text)
@@ -0,0 +1,200 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+import time
+
+import numpy as np
+from arena_api.system import system
+
+# Delta time in nanoseconds between latching the PTP time and firing
+ACTION_DELTA_TIME_NS = 100000000
+# Exposure time in microseconds shared by all synchronized cameras
+EXPOSURE_TIME_US = 5000.0
+
+
+def wait_for_ptp(devices, timeout_s=60):
+    """
+    Waits until exactly one camera is PTP master and the others slaves.
+    """
+    start_time = time.monotonic()
+    while time.monotonic() - start_time < timeout_s:
+        status_list = [device.nodemap['PtpStatus'].value for device in devices]
+        if status_list.count('Master') == 1 and \
+                status_list.count('Slave') == len(devices) - 1:
+            return
+        time.sleep(0.5)
+    raise TimeoutError(f'PTP negotiation did not finish within {timeout_s} s')
+
+
+class SyncFrameSet:
+    """
+    Frames of all cameras captured by one action command.
+    skew_ns maps the serial number to the frame timestamp minus the
+    scheduled action time.
+    """
+
+    def __init__(self, trigger_index, action_time_ns):
+        self.trigger_index = trigger_index
+        self.action_time_ns = action_time_ns
+        self.frames = {}
+        self.timestamps_ns = {}
+        self.skew_ns = {}
+        self.missing = []
+
+    def is_complete(self):
+        return not self.missing
+
+
+class SyncCaptureOrchestrator:
+    """
+    Synchronized capture for any number of GigE cameras.
+    Generalizes examples/py_scheduled_action_commands.py: every camera is
+    triggered by a PTP scheduled action command and transmits its image in
+    turn through user controlled TransferStart/TransferStop so that bursts
+    of several cameras never share the link at the same time.
+    """
+
+    def __init__(self, devices, delta_time_ns=ACTION_DELTA_TIME_NS,
+                 exposure_time_us=EXPOSURE_TIME_US, device_key=1, group_key=1,
+                 group_mask=1, timeout_ms=2000):
+        self.devices = devices
+        self.delta_time_ns = delta_time_ns
+        self.exposure_time_us = exposure_time_us
+        self.device_key = device_key
+        self.group_key = group_key
+        self.group_mask = group_mask
+        self.timeout_ms = timeout_ms
+        self.serials = [device.nodemap['DeviceSerialNumber'].value for device in devices]
+        self.trigger_count = 0
+        self.skew_history = {serial: [] for serial in self.serials}
+
+    # Configuration -----------------------------------------------------------
+    def configure(self):
+        """
+        Prepares all cameras and the system for action command triggering.
+        """
+        for device in self.devices:
+            self._configure_device(device)
+        sys_tl_map = system.tl_system_nodemap
+        sys_tl_map['ActionCommandDeviceKey'].value = self.device_key
+        sys_tl_map['ActionCommandGroupKey'].value = self.group_key
+        sys_tl_map['ActionCommandGroupMask'].value = self.group_mask
+        sys_tl_map['ActionCommandTargetIP'].value = 0xFFFFFFFF
+
+    def _configure_device(self, device):
+        tl_stream_nodemap = device.tl_stream_nodemap
+        tl_stream_nodemap['StreamAutoNegotiatePacketSize'].value = True
+        tl_stream_nodemap['StreamPacketResendEnable'].value = True
+
+        nodemap = device.nodemap
+        # exposure must match on all cameras to get synchronized images
+        nodemap['ExposureAuto'].value = 'Off'
+        exposure_node = nodemap['ExposureTime']
+        exposure_node.value = min(max(self.exposure_time_us, exposure_node.min),
+                                  exposure_node.max)
+        # one frame per action command
+        nodemap['TriggerMode'].value = 'On'
+        nodemap['TriggerSource'].value = 'Action0'
+        nodemap['TriggerSelector'].value = 'FrameStart'
+        nodemap['ActionUnconditionalMode'].value = 'On'
+        nodemap['ActionSelector'].value = 0
+        nodemap['ActionDeviceKey'].value = self.device_key
+        nodemap['ActionGroupKey'].value = self.group_key
+        nodemap['ActionGroupMask'].value = self.group_mask
+        # frames stay on the camera until the host asks for them
+        nodemap['TransferControlMode'].value = 'UserControlled'
+        nodemap['TransferOperationMode'].value = 'Continuous'
+        nodemap['TransferStop'].execute()
+        nodemap['PtpEnable'].value = True
+
+    def wait_for_ptp(self, timeout_s=60):
+        wait_for_ptp(self.devices, timeout_s)
+
+    # Capture -----------------------------------------------------------------
+    def trigger(self):
+        """
+        Schedules an action command delta_time_ns ahead of the PTP time,
+        then collects one frame per camera, one transfer at a time.
+        """
+        latch_nodemap = self.devices[0].nodemap
+        latch_nodemap['PtpDataSetLatch'].execute()
+        action_time_ns = latch_nodemap['PtpDataSetLatchValue'].value + self.delta_time_ns
+
+        sys_tl_map = system.tl_system_nodemap
+        sys_tl_map['ActionCommandExecuteTime'].value = action_time_ns
+        sys_tl_map['ActionCommandFireCommand'].execute()
+
+        frame_set = SyncFrameSet(self.trigger_count, action_time_ns)
+        self.trigger_count += 1
+        # the first transfer waits for the exposure, later cameras already
+        # hold their frame and only need the link
+        timeout_ms = self.timeout_ms + self.delta_time_ns // 1000000
+        for serial, device in zip(self.serials, self.devices):
+            device.nodemap['TransferStart'].execute()
+            try:
+                buffer = device.get_buffer(timeout=timeout_ms)
+            except TimeoutError:
+                frame_set.missing.append(serial)
+                continue
+            finally:
+                device.nodemap['TransferStop'].execute()
+            self._add_buffer(frame_set, serial, buffer)
+            device.requeue_buffer(buffer)
+            timeout_ms = self.timeout_ms
+        return frame_set
+
+    def _add_buffer(self, frame_set, serial, buffer):
+        if buffer.is_incomplete:
+            frame_set.missing.append(serial)
+            return
+        bytes_per_pixel = int(buffer.bits_per_pixel / 8)
+        frame_set.frames[serial] = np.ctypeslib.as_array(
+            buffer.pdata, (buffer.height, buffer.width, bytes_per_pixel)).copy()
+        frame_set.timestamps_ns[serial] = buffer.timestamp_ns
+        frame_set.skew_ns[serial] = buffer.timestamp_ns - frame_set.action_time_ns
+        self.skew_history[serial].append(frame_set.skew_ns[serial])
+
+    def capture(self, number_of_triggers, buffer_count=10):
+        """
+        Streams all cameras and yields one SyncFrameSet per trigger.
+        """
+        for device in self.devices:
+            device.start_stream(buffer_count)
+        try:
+            for _ in range(number_of_triggers):
+                yield self.trigger()
+        finally:
+            for device in self.devices:
+                device.stop_stream()
+
+    def get_skew_report(self):
+        """
+        Returns per camera statistics of the trigger to frame skew in us.
+        """
+        report = {}
+        for serial, skew_list in self.skew_history.items():
+            if not skew_list:
+                continue
+            skew_us = np.asarray(skew_list, dtype=np.float64) / 1000
+            report[serial] = {'count': len(skew_list),
+                              'mean_us': float(skew_us.mean()),
+                              'min_us': float(skew_us.min()),
+                              'max_us': float(skew_us.max())}
+        return report
+
+
+if __name__ == '__main__':
+    from py_acquisition_single_device import create_devices_with_tries
+
+    devices = create_devices_with_tries()
+    orchestrator = SyncCaptureOrchestrator(devices)
+    orchestrator.configure()
+    print('Waiting for PTP Master/Slave negotiation')
+    orchestrator.wait_for_ptp()
+    for frame_set in orchestrator.capture(20):
+        print(f'Trigger {frame_set.trigger_index}: '
+              f'{len(frame_set.frames)}/{len(devices)} frames, missing {frame_set.missing}')
+    for serial, stats in orchestrator.get_skew_report().items():
+        print(f'''{serial}: mean {stats['mean_us']:.1f} us, '''
+              f'''min {stats['min_us']:.1f} us, max {stats['max_us']:.1f} us''')
+    system.destroy_device()
@@ -0,0 +1,199 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+import threading
+import time
+
+# Timeout in milliseconds for the exposure end signal and buffers
+TRIGGER_TIMEOUT_MS = 2000
+
+
+class TriggeredCamera:
+    """
+    Software triggered camera that fires the next trigger as soon as the
+    sensor is free instead of polling TriggerArmed.
+    mode 'exposure_end' waits on the ExposureEnd event (as in
+    examples/py_callback_on_event.py), mode 'leader' on the leader of the
+    next buffer (examples/py_trigger_waitfornextleader.py), which needs no
+    event channel but also includes the readout.
+    """
+
+    def __init__(self, device, process=None, mode='exposure_end', timeout_ms=TRIGGER_TIMEOUT_MS):
+        if mode not in ('exposure_end', 'leader'):
+            raise ValueError(f'Unknown trigger mode {mode}')
+        self.device = device
+        self.process = process
+        self.mode = mode
+        self.timeout_ms = timeout_ms
+        self.serial = device.nodemap['DeviceSerialNumber'].value
+        self.trigger_count = 0
+        self.frame_count = 0
+        self.incomplete_count = 0
+        self.timeout_count = 0
+        self._initial = {}
+
+    def _set(self, nodemap_name, node_name, value):
+        """
+        Writes a node and remembers the value it had before the first write,
+        read after the selectors written so far, for restore().
+        """
+        node = getattr(self.device, nodemap_name)[node_name]
+        initial = node.value
+        node.value = value
+        self._initial.setdefault((nodemap_name, node_name), initial)
+
+    def configure(self, buffer_handling_mode='OldestFirst'):
+        self._set('nodemap', 'TriggerSelector', 'FrameStart')
+        self._set('nodemap', 'TriggerMode', 'On')
+        self._set('nodemap', 'TriggerSource', 'Software')
+        try:
+            # accept the next trigger while the previous frame is read out
+            self._set('nodemap', 'TriggerOverlap', 'PreviousFrame')
+        except (KeyError, ValueError):
+            pass
+        self._set('tl_stream_nodemap', 'StreamBufferHandlingMode', buffer_handling_mode)
+        if self.mode == 'exposure_end':
+            self.device.initialize_events()
+            self._set('nodemap', 'EventSelector', 'ExposureEnd')
+            self._set('nodemap', 'EventNotification', 'On')
+
+    def restore(self):
+        """
+        Writes back every node configure() changed, in reverse order, so
+        the selected entries are restored before their selector.
+        """
+        for (nodemap_name, node_name), value in reversed(self._initial.items()):
+            getattr(self.device, nodemap_name)[node_name].value = value
+        self._initial.clear()
+        if self.mode == 'exposure_end':
+            self.device.deinitialize_events()
+
+    def get_theoretical_max_fps(self):
+        """
+        Frame rate the device allows with the current settings, which
+        already accounts for exposure and readout.
+        """
+        return self.device.nodemap['AcquisitionFrameRate'].max
+
+    def trigger_and_wait(self):
+        """
+        Fires one software trigger and blocks until the sensor is free for
+        the next one. Returns False on timeout.
+        """
+        if self.mode == 'leader':
+            self.device.reset_wait_for_next_leader()
+        self.device.nodemap['TriggerSoftware'].execute()
+        self.trigger_count += 1
+        try:
+            if self.mode == 'exposure_end':
+                self.device.wait_on_event(self.timeout_ms)
+            else:
+                self.device.wait_for_next_leader(self.timeout_ms)
+        except TimeoutError:
+            self.timeout_count += 1
+            return False
+        return True
+
+    def receive(self, stop_event, expected):
+        """
+        Buffer loop running next to the trigger loop, so that retrieving
+        and processing a frame never delays the next trigger.
+        """
+        while not (stop_event.is_set() and
+                   self.frame_count + self.incomplete_count >= expected()):
+            try:
+                buffer = self.device.get_buffer(timeout=self.timeout_ms)
+            except TimeoutError:
+                if stop_event.is_set():
+                    break
+                continue
+            if buffer.is_incomplete:
+                self.incomplete_count += 1
+            else:
+                self.frame_count += 1
+                if self.process is not None:
+                    self.process(self.serial, buffer)
+            self.device.requeue_buffer(buffer)
+
+
+class TriggerController:
+    """
+    Pipelined software triggering of several cameras. Each camera has a
+    trigger thread and a receive thread; with lockstep the trigger threads
+    meet at a barrier so every camera is triggered together.
+    """
+
+    def __init__(self, devices, process=None, mode='exposure_end', lockstep=False,
+                 buffer_count=10):
+        self.cameras = [TriggeredCamera(device, process, mode) for device in devices]
+        self.lockstep = lockstep
+        self.buffer_count = buffer_count
+        self.elapsed_s = 0.0
+
+    def _trigger_loop(self, camera, number_of_triggers, barrier, stop_event):
+        for _ in range(number_of_triggers):
+            if stop_event.is_set():
+                break
+            if barrier is not None:
+                try:
+                    barrier.wait(camera.timeout_ms / 1000)
+                except threading.BrokenBarrierError:
+                    break
+            camera.trigger_and_wait()
+
+    def run(self, number_of_triggers):
+        """
+        Triggers every camera number_of_triggers times as fast as the
+        sensors allow and returns the report.
+        """
+        for camera in self.cameras:
+            camera.configure()
+            camera.device.start_stream(self.buffer_count)
+        stop_event = threading.Event()
+        barrier = threading.Barrier(len(self.cameras)) if self.lockstep else None
+        threads = []
+        for camera in self.cameras:
+            threads.append(threading.Thread(
+                target=camera.receive,
+                args=(stop_event, lambda camera=camera: camera.trigger_count - camera.timeout_count)))
+            threads.append(threading.Thread(
+                target=self._trigger_loop,
+                args=(camera, number_of_triggers, barrier, stop_event)))
+        start_time = time.monotonic()
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads[1::2]:
+                thread.join()
+        finally:
+            stop_event.set()
+            for thread in threads[::2]:
+                thread.join()
+        self.elapsed_s = time.monotonic() - start_time
+        for camera in self.cameras:
+            camera.device.stop_stream()
+            camera.restore()
+        return self.get_report()
+
+    def get_report(self):
+        report = {}
+        for camera in self.cameras:
+            achieved = camera.frame_count / self.elapsed_s if self.elapsed_s else 0.0
+            report[camera.serial] = {'triggers': camera.trigger_count,
+                                     'frames': camera.frame_count,
+                                     'incomplete': camera.incomplete_count,
+                                     'timeouts': camera.timeout_count,
+                                     'achieved_fps': achieved,
+                                     'theoretical_fps': camera.get_theoretical_max_fps()}
+        return report
+
+
+if __name__ == '__main__':
+    from py_acquisition_single_device import create_devices_with_tries
+
+    devices = create_devices_with_tries()
+    controller = TriggerController(devices, lockstep=len(devices) > 1)
+    for serial, stats in controller.run(100).items():
+        print(f'''{serial}: {stats['achieved_fps']:.1f} triggers/s of '''
+              f'''{stats['theoretical_fps']:.1f} max, {stats['incomplete']} incomplete, '''
+              f'''{stats['timeouts']} timeouts''')
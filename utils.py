@@ -1,9 +1,15 @@
 # @Author:ZhangZl
 # @Date:26/11/2021
 
+import datetime
+import os
+import time
+
 import cv2
 import numpy as np
 
+from log_queue import log_event
+
 
 class polarizedImage:
     def __init__(self, raw_image):
@@ -23,9 +29,132 @@ class polarizedImage:
         return cv2.resize(self.raw_image, (self.width // 4, self.height // 4))
 
 
+# Display and save helpers of the acquisition scripts, kept free of arena_api
+# so that they can be benchmarked without a camera or the SDK installed.
+
+def get_cat_image(buffer_array, tracer=None, latency_ms=None):
+    image_d0 = cv2.cvtColor(buffer_array[:, :, 0], cv2.COLOR_BayerRG2RGB)
+    image_d45 = cv2.cvtColor(buffer_array[:, :, 1], cv2.COLOR_BayerRG2RGB)
+    image_d90 = cv2.cvtColor(buffer_array[:, :, 2], cv2.COLOR_BayerRG2RGB)
+    image_d135 = cv2.cvtColor(buffer_array[:, :, 3], cv2.COLOR_BayerRG2RGB)
+    if tracer is not None:
+        tracer.mark('cvtColor')
+    cv2.putText(image_d0, "degree 0", (10, 45), fontFace=cv2.FONT_HERSHEY_COMPLEX, fontScale=1.5, thickness=2, color=(0, 0, 255))
+    cv2.putText(image_d45, "degree 45", (10, 45), fontFace=cv2.FONT_HERSHEY_COMPLEX, fontScale=1.5, thickness=2, color=(0, 0, 255))
+    cv2.putText(image_d90, "degree 90", (10, 45), fontFace=cv2.FONT_HERSHEY_COMPLEX, fontScale=1.5, thickness=2, color=(0, 0, 255))
+    cv2.putText(image_d135, "degree 135", (10, 45), fontFace=cv2.FONT_HERSHEY_COMPLEX, fontScale=1.5, thickness=2, color=(0, 0, 255))
+    if tracer is not None:
+        tracer.mark('putText')
+    img1 = np.concatenate((image_d0, image_d45), axis=1)
+    img2 = np.concatenate((image_d90, image_d135), axis=1)
+    img = np.concatenate((img1, img2), axis=0)
+    if latency_ms is not None:
+        cv2.putText(img, f"latency {latency_ms:.1f} ms", (10, img.shape[0] - 20), fontFace=cv2.FONT_HERSHEY_COMPLEX, fontScale=3, thickness=4, color=(0, 255, 0))
+    if tracer is not None:
+        tracer.mark('concatenate')
+    return img
+
+
+def save_images(buffer_array, save_dir, metadata=None):
+    now = datetime.datetime.now()
+    save_dir = f'''{save_dir}/{now.year}-{now.month}-{now.day}'''
+    if not os.path.exists(save_dir):
+        os.makedirs(save_dir)
+    a = str(now)
+    image_d0 = cv2.cvtColor(buffer_array[:, :, 0], cv2.COLOR_BayerRG2RGB)
+    cv2.imwrite('{}/{}_0.png'.format(save_dir,
+                                     time.strftime('%y-%m-%d-%H-%M-%S-',
+                                                   time.localtime(time.time())) + a[a.rfind('.') + 1:]), image_d0)
+    image_d45 = cv2.cvtColor(buffer_array[:, :, 1], cv2.COLOR_BayerRG2RGB)
+    cv2.imwrite('{}/{}_45.png'.format(save_dir,
+                                      time.strftime('%y-%m-%d-%H-%M-%S-',
+                                                    time.localtime(time.time())) + a[a.rfind('.') + 1:]), image_d45)
+    image_d90 = cv2.cvtColor(buffer_array[:, :, 2], cv2.COLOR_BayerRG2RGB)
+    cv2.imwrite('{}/{}_90.png'.format(save_dir,
+                                      time.strftime('%y-%m-%d-%H-%M-%S-',
+                                                    time.localtime(time.time())) + a[a.rfind('.') + 1:]), image_d90)
+    image_d135 = cv2.cvtColor(buffer_array[:, :, 3], cv2.COLOR_BayerRG2RGB)
+    cv2.imwrite('{}/{}_135.png'.format(save_dir,
+                                       time.strftime('%y-%m-%d-%H-%M-%S-',
+                                                     time.localtime(time.time())) + a[a.rfind('.') + 1:]), image_d135)
+    if metadata is not None:
+        log_event('saved', "image save in {} at {}".format(save_dir, a), frame_id=metadata.frame_id, metadata=metadata)
+    else:
+        log_event('saved', "image save in {} at {}".format(save_dir, a))
+
+
+def get_RGB8_image(buffer_array):
+    image_d0 = cv2.cvtColor(buffer_array[:, :, 0], cv2.COLOR_BayerRG2RGB)
+    image_d45 = cv2.cvtColor(buffer_array[:, :, 1], cv2.COLOR_BayerRG2RGB)
+    image_d90 = cv2.cvtColor(buffer_array[:, :, 2], cv2.COLOR_BayerRG2RGB)
+    image_d135 = cv2.cvtColor(buffer_array[:, :, 3], cv2.COLOR_BayerRG2RGB)
+
+    return [image_d0, image_d45, image_d90, image_d135]
+
+
+def get_stereo_cat_image(image_list):
+    image_d0 = image_list[0]
+    # cv2.putText(image_d0, "degree 0", (10, 45), fontFace=cv2.FONT_HERSHEY_COMPLEX, fontScale=1.5, thickness=2, color=(0, 0, 255))
+    image_d45 = image_list[1]
+    # cv2.putText(image_d45, "degree 45", (10, 45), fontFace=cv2.FONT_HERSHEY_COMPLEX, fontScale=1.5, thickness=2, color=(0, 0, 255))
+    image_d90 = image_list[2]
+    # cv2.putText(image_d90, "degree 90", (10, 45), fontFace=cv2.FONT_HERSHEY_COMPLEX, fontScale=1.5, thickness=2, color=(0, 0, 255))
+    image_d135 = image_list[3]
+    # cv2.putText(image_d135, "degree 135", (10, 45), fontFace=cv2.FONT_HERSHEY_COMPLEX, fontScale=1.5, thickness=2, color=(0, 0, 255))
+    img1 = np.concatenate((image_d0, image_d45), axis=1)
+    img2 = np.concatenate((image_d90, image_d135), axis=1)
+    image_cat = np.concatenate((img1, img2), axis=0)
+
+    return image_cat
+
+
+def save_stereo_images(image_lists, save_dir, metadata_list=None):
+    now = datetime.datetime.now()
+    now_string = str(now)
+    left_save_dir = f'''{save_dir[0]}/{now.year}-{now.month}-{now.day}'''
+    if not os.path.exists(left_save_dir):
+        os.makedirs(left_save_dir)
+    right_save_dir = f'''{save_dir[1]}/{now.year}-{now.month}-{now.day}'''
+    if not os.path.exists(right_save_dir):
+        os.makedirs(right_save_dir)
+
+    left_list, right_list = image_lists[0], image_lists[1]
+    cv2.imwrite('{}/{}_0.png'.format(left_save_dir,
+                                     time.strftime('left_%y-%m-%d-%H-%M-%S-',
+                                                   time.localtime(time.time())) + now_string[now_string.rfind('.') + 1:]), left_list[0])
+    cv2.imwrite('{}/{}_45.png'.format(left_save_dir,
+                                      time.strftime('left_%y-%m-%d-%H-%M-%S-',
+                                                    time.localtime(time.time())) + now_string[now_string.rfind('.') + 1:]), left_list[1])
+    cv2.imwrite('{}/{}_90.png'.format(left_save_dir,
+                                      time.strftime('left_%y-%m-%d-%H-%M-%S-',
+                                                    time.localtime(time.time())) + now_string[now_string.rfind('.') + 1:]), left_list[2])
+    cv2.imwrite('{}/{}_135.png'.format(left_save_dir,
+                                       time.strftime('left_%y-%m-%d-%H-%M-%S-',
+                                                     time.localtime(time.time())) + now_string[now_string.rfind('.') + 1:]), left_list[3])
+    # right
+    cv2.imwrite('{}/{}_0.png'.format(right_save_dir,
+                                     time.strftime('right_%y-%m-%d-%H-%M-%S-',
+                                                   time.localtime(time.time())) + now_string[now_string.rfind('.') + 1:]), right_list[0])
+    cv2.imwrite('{}/{}_45.png'.format(right_save_dir,
+                                      time.strftime('right_%y-%m-%d-%H-%M-%S-',
+                                                    time.localtime(time.time())) + now_string[now_string.rfind('.') + 1:]), right_list[1])
+    cv2.imwrite('{}/{}_90.png'.format(right_save_dir,
+                                      time.strftime('right_%y-%m-%d-%H-%M-%S-',
+                                                    time.localtime(time.time())) + now_string[now_string.rfind('.') + 1:]), right_list[2])
+    cv2.imwrite('{}/{}_135.png'.format(right_save_dir,
+                                       time.strftime('right_%y-%m-%d-%H-%M-%S-',
+                                                     time.localtime(time.time())) + now_string[now_string.rfind('.') + 1:]), right_list[3])
+
+    if metadata_list is not None:
+        log_event('saved', "image save in {}/{} at {}".format(left_save_dir, right_save_dir, now_string),
+                  left=metadata_list[0], right=metadata_list[1])
+    else:
+        log_event('saved', "image save in {}/{} at {}".format(left_save_dir, right_save_dir, now_string))
+
+
 if __name__ == "__main__":
     imgP = cv2.imread('./TRI050S-Q-194100034/21-12-01-14-40-55-980008_0.png',cv2.IMREAD_UNCHANGED)
     imgA = cv2.imread('TRI050S-Q-194100034/LUCID_TRI050S-Q_194100034__20211201144118899_image0_0.jpg', cv2.IMREAD_UNCHANGED)
     imgD = np.mean(imgA-imgP)
 
-    print("debug")
+    log_event('debug', f'mean difference {imgD}')
@@ -0,0 +1,77 @@
+# @Author:ZhangZl
+# @Date:18/10/2026
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from log_queue import log_event
+from node_config import POLARIZED_NODE_CONFIG, apply_node_config
+
+# Streamable node files are kept per serial number and configuration hash
+WARM_START_DIR = 'warm_start_cache'
+
+
+def get_config_hash(node_config):
+    """
+    Returns a short stable hash of a node configuration.
+    """
+    text = json.dumps([list(entry) for entry in node_config], sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+
+def get_cache_paths(cache_dir, serial, config_hash):
+    base = os.path.join(cache_dir, f'{serial}_{config_hash}')
+    return f'{base}.txt', f'{base}.json'
+
+
+def warm_start_configure(device, node_config=POLARIZED_NODE_CONFIG, cache_dir=WARM_START_DIR):
+    """
+    Configures a device from its cached streamable node file in one bulk
+    load. Falls back to node_config.apply_node_config when there is no file
+    for this serial and configuration, or the firmware changed, and then
+    writes a fresh file for the next start.
+    Returns 'warm' or 'cold'.
+    """
+    nodemap = device.nodemap
+    serial = nodemap['DeviceSerialNumber'].value
+    firmware = nodemap['DeviceFirmwareVersion'].value
+    streamable_path, meta_path = get_cache_paths(cache_dir, serial, get_config_hash(node_config))
+
+    if os.path.exists(streamable_path) and os.path.exists(meta_path):
+        with open(meta_path, 'r') as file:
+            meta = json.load(file)
+        if meta.get('firmware') == firmware:
+            try:
+                nodemap.read_streamable_node_values_from(streamable_path)
+                # transport layer nodes are not part of the streamable file
+                apply_node_config(device, [entry for entry in node_config
+                                           if entry[0] != 'nodemap'])
+                return 'warm'
+            except Exception as error:
+                log_event('warm_start_failed', f'{error}, configuring node by node', device=serial,
+                          level='WARNING')
+
+    apply_node_config(device, node_config)
+    os.makedirs(cache_dir, exist_ok=True)
+    nodemap.write_streamable_node_values_to(streamable_path)
+    with open(meta_path, 'w') as file:
+        json.dump({'serial': serial, 'firmware': firmware,
+                   'model': nodemap['DeviceModelName'].value,
+                   'created': time.strftime('%Y-%m-%d %H:%M:%S')}, file)
+    return 'cold'
+
+
+def warm_start_devices(devices, node_config=POLARIZED_NODE_CONFIG, cache_dir=WARM_START_DIR):
+    """
+    Runs warm_start_configure for all devices concurrently.
+    """
+    start_time = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, len(devices))) as executor:
+        modes = list(executor.map(
+            lambda device: warm_start_configure(device, node_config, cache_dir), devices))
+    log_event('configured', f'Configured {len(devices)} device(s) in {time.monotonic() - start_time:.3f} s '
+                            f'({modes.count("warm")} warm, {modes.count("cold")} cold)')
+    return modes